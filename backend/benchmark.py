@@ -0,0 +1,291 @@
+# benchmark.py
+# 추천 파이프라인 벤치마크 (오프라인, 번들 CSV만 사용) → JSON
+#   - 단계별: calculate_A_from_survey / calculate_er_sigma / optimize_portfolio / 차트 렌더 (/plot)
+#   - 합성 펀드 유니버스 300/1k/5k개 × 공분산 모델(category/factor)
+#   - FastAPI 앱을 프로세스 안에서 구동해 종단 간 처리량/지연 백분위
+#   python benchmark.py [--out bench.json] [--sizes 300,1000,5000] [--requests 200] [--compare 이전결과.json]
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from types import SimpleNamespace
+
+import numpy as np
+
+from correlation import FUND_CATEGORIES, build_rule_table
+from factor import COVARIANCE_MODELS, CovarianceModel, IndexLinks
+from optimizer import assemble_asset_universe, calculate_er_sigma, get_alpha_by_A, optimize_portfolio
+from utils import INVESTOR_ITEMS, TARGET_RISKY_MAPPING, calculate_A_from_survey, get_target_risky_ratio
+
+DENSE_MAX_SIZE = 2000       # 이보다 큰 유니버스는 N×N 공분산(category)을 만들지 않음 (메모리)
+SYNTHETIC_INDICES = 40      # 합성 유니버스의 참고 지수 수
+
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms, dtype=float)
+    if samples.size == 0:
+        return {"n": 0}
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {"n": int(samples.size), "mean": round(float(samples.mean()), 3), "p50": round(float(p50), 3),
+            "p90": round(float(p90), 3), "p99": round(float(p99), 3), "max": round(float(samples.max()), 3)}
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+# 모듈이 print로 남기는 로그([WARN] 등)는 화면에 찍지 않음
+@contextlib.contextmanager
+def _quiet():
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+# 설문 점수표의 선택지에서 무작위 응답 생성 (연령대 × 투자성향설문 유형을 모두 순환)
+def synthetic_users(survey_index, count, seed=0):
+    rng = np.random.default_rng(seed)
+    age_groups = list(survey_index.age_scores)
+    investment_types = list(TARGET_RISKY_MAPPING)
+    investor_options = {}
+    for item, value in survey_index.investor_scores:
+        if item in INVESTOR_ITEMS and item != "투자성향설문":
+            investor_options.setdefault(item, []).append(value)
+
+    users = []
+    for i in range(count):
+        age_group = age_groups[i % len(age_groups)]
+        investment_type = investment_types[(i // len(age_groups)) % len(investment_types)]
+        answers = {item: str(rng.choice(list(scores))) for (group, item), scores in survey_index.item_scores.items()
+                   if group == age_group and item != "투자성향"}  # 투자성향은 점수 계산 중에 채워짐
+        answers.update({item: str(rng.choice(values)) for item, values in investor_options.items()})
+        answers["투자성향설문"] = investment_type
+        users.append({"age_group": age_group, "answers": answers})
+    return users
+
+
+def _user(payload):
+    return SimpleNamespace(age_group=payload["age_group"], answers=dict(payload["answers"]))
+
+
+# 합성 펀드 유니버스 (카테고리/기대수익률/변동성/참고 지수 무작위)
+def synthetic_universe(size, covariance_model, rule_table, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = tuple(f"IDX{k:02d}" for k in range(SYNTHETIC_INDICES))
+    categories = tuple(FUND_CATEGORIES[code] for code in rng.integers(0, len(FUND_CATEGORIES), size))
+    links = IndexLinks(
+        primary=tuple(labels[k] for k in rng.integers(0, len(labels), size)),
+        primary_weights=rng.uniform(0.5, 1.0, size),
+        secondary=('',) * size,
+        secondary_weights=np.zeros(size),
+    )
+    return assemble_asset_universe(
+        tuple(f"펀드_합성{i:05d}" for i in range(size)), categories,
+        rng.uniform(0.01, 0.15, size), rng.uniform(0.05, 0.40, size), rule_table, links, covariance_model)
+
+
+def bench_scoring(survey_index, users):
+    samples = []
+    for payload in users:
+        _, elapsed = _timed(calculate_A_from_survey, _user(payload), None, None, survey_index=survey_index)
+        samples.append(elapsed)
+    return {"calculate_A_from_survey_ms": summarize(samples)}
+
+
+# 유니버스 하나에서 입력 몇 개를 끝까지: ER/Sigma → 최적화 → 차트
+def bench_universe(universe, dataset, users, solver, renderer):
+    er_sigma_ms, optimize_ms, render_ms, nonzero = [], [], [], []
+    for payload in users:
+        user = _user(payload)
+        A, _, _ = calculate_A_from_survey(user, None, None, survey_index=dataset.survey_index)
+        target_risky_ratio = get_target_risky_ratio(payload["answers"]["투자성향설문"])
+        if target_risky_ratio <= 0:
+            continue  # 안정형은 최적화 없이 예금만
+        market, elapsed = _timed(calculate_er_sigma, None, None, A, user, universe=universe,
+                                 deposit_index=dataset.deposit_index)
+        er_sigma_ms.append(elapsed)
+        ER, Sigma, asset_names, principal_asset_indices, non_principal_asset_indices = market
+        with _quiet():
+            (weights, _), elapsed = _timed(optimize_portfolio, ER, Sigma, A, principal_asset_indices,
+                                           non_principal_asset_indices, target_risky_ratio, get_alpha_by_A(A),
+                                           solver=solver)
+        optimize_ms.append(elapsed)
+        nonzero.append(int((weights > 0.001).sum()))
+
+        shown = [(name, float(w)) for name, w in zip(asset_names, weights) if w > 0.01]
+        renderer.cache.invalidate()  # 캐시 없이 매번 그림
+        _, elapsed = _timed(renderer.render, [name for name, _ in shown], [w for _, w in shown], "png")
+        render_ms.append(elapsed)
+    return {
+        "calculate_er_sigma_ms": summarize(er_sigma_ms),
+        "optimize_portfolio_ms": summarize(optimize_ms),
+        "plot_render_ms": summarize(render_ms),
+        "nonzero_assets_mean": round(float(np.mean(nonzero)), 1) if nonzero else None,
+    }
+
+
+# 앱을 프로세스 안에서 구동 (lifespan 포함), 동시 요청 수를 제한해 지연/처리량 측정
+async def _drive_app(app, lifespan, users, endpoint, concurrency):
+    import httpx
+
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client, payload):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(endpoint, json=payload)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(one(client, payload) for payload in users))
+            elapsed = time.perf_counter() - started
+    return {
+        "requests": len(users),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(users) / elapsed, 2),
+        "latency_ms": summarize(latencies),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def bench_app(users, concurrency):
+    os.environ.setdefault('IRP_DATA_WATCH_INTERVAL', '0')
+    with _quiet():
+        import main
+    results = {}
+    for endpoint in ("/recommend", "/plot"):
+        main.result_cache.invalidate()
+        main.chart_renderer.cache.invalidate()
+        with _quiet():
+            results[endpoint] = asyncio.run(_drive_app(main.app, main.lifespan, users, endpoint, concurrency))
+        results[endpoint]["result_cache"] = main.result_cache.stats()
+    results["dataset"] = {"source": main.dataset_manager.current.dataset.source,
+                          "precomputed": main.dataset_manager.stats()["precomputed"]}
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _environment(args):
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "solver": args.solver,
+        "irp_env": {key: value for key, value in sorted(os.environ.items()) if key.startswith('IRP_')},
+    }
+
+
+# 이전 결과와 p50 비교 (1보다 크면 느려짐)
+def compare(current, baseline, path=""):
+    lines = []
+    for key, value in current.items():
+        other = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict) and "p50" in value and isinstance(other, dict) and other.get("p50"):
+            lines.append(f"{path}{key}: p50 {other['p50']:.3f} → {value['p50']:.3f}ms (×{value['p50'] / other['p50']:.2f})")
+        elif isinstance(value, dict) and isinstance(other, dict):
+            lines.extend(compare(value, other, f"{path}{key}/"))
+        elif key == "throughput_rps" and isinstance(other, (int, float)) and other:
+            lines.append(f"{path}{key}: {other:.2f} → {value:.2f} (×{value / other:.2f})")
+    return lines
+
+
+def main():
+    from snapshot import read_csv_dataset
+    from rendering import ChartRenderer
+
+    parser = argparse.ArgumentParser(description="IRP 추천 파이프라인 벤치마크")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--sizes", default="300,1000,5000", help="합성 펀드 유니버스 크기 (쉼표 구분)")
+    parser.add_argument("--models", default=",".join(COVARIANCE_MODELS), help="공분산 모델 (쉼표 구분)")
+    parser.add_argument("--solver", default=os.environ.get('IRP_SOLVER', 'qp'))
+    parser.add_argument("--users", type=int, default=200, help="단계별 측정에 쓸 합성 설문 수")
+    parser.add_argument("--solves", type=int, default=10, help="유니버스당 최적화 횟수")
+    parser.add_argument("--requests", type=int, default=200, help="종단 간 측정 요청 수 (0이면 생략)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", default=None, help="비교할 이전 결과 JSON")
+    args = parser.parse_args()
+
+    # 요청별 로그/글꼴 경고는 측정 결과만 보이도록 숨김
+    warnings.filterwarnings("ignore", message="Glyph .* missing from font")
+    for name in ("main", "httpx", "matplotlib"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    rule_table = build_rule_table()
+    dataset = read_csv_dataset(args.data_dir)
+    users = synthetic_users(dataset.survey_index, args.users, args.seed)
+    renderer = ChartRenderer(max_entries=4)
+    with _quiet():
+        renderer.render(["예금_준비"], [1.0], "png")  # matplotlib import/글꼴 로드는 제외
+
+    report = {"environment": _environment(args), "stages": bench_scoring(dataset.survey_index, users)}
+    print(f"[BENCH] calculate_A_from_survey p50 {report['stages']['calculate_A_from_survey_ms']['p50']:.3f}ms")
+
+    # 번들 데이터 + 합성 유니버스
+    solve_users = [payload for payload in users if TARGET_RISKY_MAPPING[payload["answers"]["투자성향설문"]] > 0]
+    solve_users = solve_users[:args.solves]
+    kinds = args.models.split(",")
+    universes = [("bundled", kind) for kind in kinds] + [(int(size), kind) for size in args.sizes.split(",")
+                                                         for kind in kinds]
+    report["universes"] = {}  # "크기/공분산 모델" → 결과 (이전 결과와 키로 비교)
+    for size, kind in universes:
+        entry = report["universes"][f"{size}/{kind}"] = {}
+        if kind == 'category' and size != "bundled" and size > DENSE_MAX_SIZE:
+            entry["skipped"] = f"N×N 공분산은 {DENSE_MAX_SIZE}개 이하에서만 측정"
+            continue
+        model = CovarianceModel(kind=kind)
+        if size == "bundled":
+            universe, elapsed = _timed(lambda: read_csv_dataset(args.data_dir, rule_table, covariance_model=model)
+                                       .fund_universe)
+        else:
+            universe, elapsed = _timed(synthetic_universe, size, model, rule_table, args.seed)
+        entry.update(funds=len(universe), build_universe_ms=round(elapsed, 3))
+        entry.update(bench_universe(universe, dataset, solve_users, args.solver, renderer))
+        print(f"[BENCH] 유니버스 {size}({kind}): ER/Sigma p50 {entry['calculate_er_sigma_ms']['p50']:.2f}ms, "
+              f"최적화 p50 {entry['optimize_portfolio_ms']['p50']:.1f}ms, 렌더 p50 {entry['plot_render_ms']['p50']:.1f}ms")
+
+    if args.requests > 0:
+        app_users = synthetic_users(dataset.survey_index, args.requests, args.seed + 1)
+        report["app"] = bench_app(app_users, args.concurrency)
+        for endpoint in ("/recommend", "/plot"):
+            result = report["app"][endpoint]
+            print(f"[BENCH] {endpoint}: {result['throughput_rps']:.1f} req/s, "
+                  f"p50 {result['latency_ms']['p50']:.1f}ms, p99 {result['latency_ms']['p99']:.1f}ms")
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[BENCH] 결과 → {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        for line in compare(report, baseline):
+            print(f"[COMPARE] {line}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# correlation.py
+import hashlib
+
+import numpy as np
+
+# 펀드 카테고리 (코드 = 튜플 내 위치)
+FUND_CATEGORIES = ('국내주식', '글로벌주식', '국내채권', '글로벌채권', '혼합형', '기타펀드')
+
+DEFAULT_CORRELATION = 0.3       # 규칙에 없는 카테고리 조합
+STOCK_BOND_CORRELATION = 0.15   # 주식-채권 조합은 항상 더 낮은 상관관계
+
+# 펀드 그룹별 상관관계 규칙 (순서 무관)
+DEFAULT_CORRELATION_RULES = {
+    ('국내주식', '국내주식'): 0.8,
+    ('글로벌주식', '글로벌주식'): 0.8,
+    ('국내채권', '국내채권'): 0.7,
+    ('글로벌채권', '글로벌채권'): 0.7,
+    ('혼합형', '혼합형'): 0.6,
+
+    ('국내주식', '글로벌주식'): 0.6,
+    ('국내채권', '글로벌채권'): 0.5,
+
+    ('국내주식', '국내채권'): 0.2,
+    ('글로벌주식', '글로벌채권'): 0.2,
+    ('국내주식', '혼합형'): 0.5,
+    ('국내채권', '혼합형'): 0.4,
+}
+
+
+# 펀드명 기반 카테고리 분류
+def classify_fund(fund_name):
+    fund_name_lower = fund_name.lower()
+    if '주식' in fund_name_lower:
+        if '글로벌' in fund_name_lower or '해외' in fund_name_lower:
+            return '글로벌주식'
+        return '국내주식'
+    elif '채권' in fund_name_lower:
+        if '글로벌' in fund_name_lower or '해외' in fund_name_lower:
+            return '글로벌채권'
+        return '국내채권'
+    elif '혼합' in fund_name_lower:
+        return '혼합형'
+    return '기타펀드'  # 분류되지 않은 펀드
+
+
+# 카테고리명 → 정수 코드
+def encode_categories(categories, category_order=FUND_CATEGORIES):
+    code_of = {cat: code for code, cat in enumerate(category_order)}
+    try:
+        return np.fromiter((code_of[cat] for cat in categories), dtype=np.intp, count=len(categories))
+    except KeyError as e:
+        raise ValueError(f"알 수 없는 펀드 카테고리: {e.args[0]}") from None
+
+
+# 규칙 dict → K×K 상관계수 조회 테이블
+def build_rule_table(rules=None, category_order=FUND_CATEGORIES,
+                     default=DEFAULT_CORRELATION, stock_bond=STOCK_BOND_CORRELATION):
+    if rules is None:
+        rules = DEFAULT_CORRELATION_RULES
+    code_of = {cat: code for code, cat in enumerate(category_order)}
+    table = np.full((len(category_order), len(category_order)), float(default))
+
+    for (cat_i, cat_j), corr_val in rules.items():
+        if cat_i not in code_of or cat_j not in code_of:
+            raise ValueError(f"상관관계 규칙에 알 수 없는 카테고리가 있습니다: ({cat_i}, {cat_j})")
+        table[code_of[cat_i], code_of[cat_j]] = corr_val
+        table[code_of[cat_j], code_of[cat_i]] = corr_val
+
+    # 주식-채권처럼 특정 조합은 규칙보다 우선해 더 낮은 상관관계
+    if stock_bond is not None:
+        is_stock = np.array(['주식' in cat for cat in category_order])
+        is_bond = np.array(['채권' in cat for cat in category_order])
+        table[np.outer(is_stock, is_bond) | np.outer(is_bond, is_stock)] = stock_bond
+
+    table.flags.writeable = False
+    return table
+
+
+# 조회 테이블 지문 (사전 계산표가 같은 상관관계 규칙으로 계산됐는지 확인, None = 기본 규칙)
+def rule_table_digest(rule_table=None):
+    table = np.ascontiguousarray(build_rule_table() if rule_table is None else rule_table, dtype=np.float64)
+    return hashlib.sha1(repr(table.shape).encode('ascii') + table.tobytes()).hexdigest()[:12]
+
+
+# 카테고리 코드 → N×N 상관관계 행렬 (팬시 인덱싱 1회)
+def build_correlation_matrix(category_codes, rule_table):
+    category_codes = np.asarray(category_codes, dtype=np.intp)
+    corr_matrix = rule_table[category_codes[:, None], category_codes[None, :]]
+    np.fill_diagonal(corr_matrix, 1.0)
+    return corr_matrix
+
+
+# CSV(카테고리1, 카테고리2, 상관계수)에서 상관관계 규칙 로드
+def load_correlation_rules(path):
+    import pandas as pd
+
+    rules_df = pd.read_csv(path, encoding='utf-8')
+    required = ['카테고리1', '카테고리2', '상관계수']
+    missing = [col for col in required if col not in rules_df.columns]
+    if missing:
+        raise ValueError(f"상관관계 규칙 파일에 필요한 컬럼이 없습니다: {missing}")
+    return {
+        (row['카테고리1'], row['카테고리2']): float(row['상관계수'])
+        for _, row in rules_df.iterrows()
+    }
@@ -0,0 +1,274 @@
+# datastore.py
+# 데이터셋 관리자: 요청 경로 밖에서 새 데이터를 만들어 세대 번호와 함께 한 번에 교체 (핫 리로드)
+#   - 데이터 디렉터리 감시(수정 시각 폴링) 또는 reload() 직접 호출
+#   - 교체 시 리스너(old, new) 호출 → 캐시는 바뀐 연령 구간만 선택적으로 무효화
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from correlation import rule_table_digest
+from factor import CovarianceModel
+from precompute import PrecomputedTable
+from screening import ScreeningConfig
+from snapshot import Dataset, data_paths, load_dataset
+
+logger = logging.getLogger(__name__)
+
+
+# 자산명 표: 데이터셋당 1회 생성 (요청마다 "예금_"/"펀드_" 접두어를 붙이지 않음)
+# 간결 응답 형식의 자산 ID = names 위치, version = /assets ETag
+@dataclass(frozen=True)
+class AssetTable:
+    names: tuple                # 전체 자산명 (연령 구간별 예금 → 펀드, 중복 없음)
+    version: str
+    deposit_names: dict         # 연령 구간 → 예금 자산명 (DepositBucket.names 순서)
+    ranked_deposit_names: dict  # 연령 구간 → 예금 자산명 (DepositBucket.ranked_names 순서)
+    _positions: dict = field(default_factory=dict, repr=False)
+    _ids: dict = field(default_factory=dict, repr=False)   # 자산명 튜플 → ID 배열
+
+    # 포트폴리오 자산명 목록 → ID 배열 (목록은 연령 구간/사전 계산표/예금 선택별로 몇 개뿐이라 목록 단위로 보관)
+    def ids(self, asset_names):
+        asset_names = tuple(asset_names)
+        ids = self._ids.get(asset_names)
+        if ids is None:
+            if not self._positions:
+                self._positions.update((name, i) for i, name in enumerate(self.names))
+            ids = np.fromiter((self._positions[name] for name in asset_names), dtype=np.intp, count=len(asset_names))
+            ids.flags.writeable = False
+            self._ids[asset_names] = ids
+        return ids
+
+
+def build_asset_table(dataset):
+    deposit_names, ranked_deposit_names = {}, {}
+    for bracket, bucket in dataset.deposit_index.buckets.items():
+        deposit_names[bracket] = tuple(f"예금_{name}" for name in bucket.names)
+        ranked_deposit_names[bracket] = tuple(f"예금_{name}" for name in bucket.ranked_names)
+    names = tuple(dict.fromkeys(
+        [name for bracket_names in deposit_names.values() for name in bracket_names]
+        + [name for bracket_names in ranked_deposit_names.values() for name in bracket_names]
+        + list(dataset.fund_universe.names)))
+    return AssetTable(
+        names=names,
+        version=hashlib.sha1("\x1f".join(names).encode('utf-8')).hexdigest()[:12],
+        deposit_names=deposit_names,
+        ranked_deposit_names=ranked_deposit_names,
+    )
+
+
+# 요청 하나가 처음부터 끝까지 같이 쓰는 불변 데이터 묶음
+@dataclass(frozen=True)
+class DatasetState:
+    generation: int             # 교체할 때마다 1씩 증가
+    dataset: Dataset
+    market_versions: dict       # 연령 구간 → 최적화 입력(예금 금리 + 펀드 ER/공분산) 지문
+    precomputed_table: PrecomputedTable = None
+    loaded_at: float = 0.0
+    asset_table: AssetTable = None
+
+    @property
+    def version(self):
+        return self.dataset.version
+
+
+# 연령 구간별 최적화 입력 지문: 설문 점수표만 바뀌면 그대로 → 최적화 결과 캐시 유지
+def market_fingerprint(bucket, universe):
+    h = hashlib.sha1()
+    h.update("\x1f".join(bucket.names).encode('utf-8'))
+    h.update(bucket.rates.tobytes())
+    h.update("\x1f".join(universe.names).encode('utf-8'))
+    h.update(universe.expected_returns.tobytes())
+    h.update(universe.cov.tobytes())
+    return h.hexdigest()[:12]
+
+
+def _load_precomputed_table(path, dataset, screening, covariance_model, rule_digest, solver):
+    if not path or not os.path.exists(os.path.join(path, 'meta.json')):
+        return None
+    table = PrecomputedTable.load(path)
+    if table.dataset_version != dataset.version:
+        logger.warning("사전 계산표 버전 %s ≠ 데이터 버전 %s → 사용 안 함", table.dataset_version, dataset.version)
+        return None
+    if table.meta.get("fund_stats", "period") != dataset.fund_stats:
+        logger.warning("사전 계산표 펀드 통계 기준 %s ≠ %s → 사용 안 함",
+                       table.meta.get("fund_stats", "period"), dataset.fund_stats)
+        return None
+    # 상관관계 규칙 지문이 없는 표는 어떤 규칙으로 계산했는지 알 수 없으므로 사용 안 함
+    if table.meta.get("correlation_digest") != rule_digest:
+        logger.warning("사전 계산표 상관관계 규칙 %s ≠ %s → 사용 안 함", table.meta.get("correlation_digest"), rule_digest)
+        return None
+    if solver is not None and table.meta.get("solver") != solver:
+        logger.warning("사전 계산표 최적화 방식 %s ≠ %s → 사용 안 함", table.meta.get("solver"), solver)
+        return None
+    # 후보 축소 기록 이전 표는 축소 없이 계산한 것
+    if table.meta.get("screening", ScreeningConfig().as_dict()) != screening.as_dict():
+        logger.warning("사전 계산표 후보 축소 설정 %s ≠ %s → 사용 안 함", table.meta.get("screening"), screening.as_dict())
+        return None
+    # 공분산 모델 기록 이전 표는 카테고리 상관관계로 계산한 것
+    if table.meta.get("covariance", CovarianceModel().as_dict()) != covariance_model.as_dict():
+        logger.warning("사전 계산표 공분산 모델 %s ≠ %s → 사용 안 함",
+                       table.meta.get("covariance"), covariance_model.as_dict())
+        return None
+    return table
+
+
+def _table_meta(table):
+    return table.meta if table is not None else None
+
+
+def _fund_summary(report):
+    if report is None:
+        return None
+    return {
+        "rows": report["rows"],
+        "loaded": report["loaded"],
+        "index_stats": report["index_stats"],
+        "period_stats": report["period_stats"],
+        "rejected": len(report["rejected"]),
+        "index_fallbacks": len(report["index_fallbacks"]),
+    }
+
+
+# 공분산 모델 설정 + 팩터 모델 보고 (지수 수, 지수에 연결되지 않은 펀드 수 등)
+def _covariance_summary(covariance_model, state):
+    report = getattr(state.dataset.fund_universe.cov, 'report', None) if state else None
+    return {**covariance_model.as_dict(), **(report or {})}
+
+
+class DatasetManager:
+    def __init__(self, data_dir='data', snapshot_path=None, rule_table=None, precomputed_dir=None,
+                 poll_interval=0.0, fund_stats='period', screening=None, covariance_model=None, solver=None):
+        self.data_dir = data_dir
+        self.fund_stats = fund_stats
+        self.screening = screening if screening is not None else ScreeningConfig()
+        self.covariance_model = covariance_model if covariance_model is not None else CovarianceModel()
+        self.snapshot_path = snapshot_path
+        self.rule_table = rule_table
+        self.rule_digest = rule_table_digest(rule_table)
+        self.solver = solver            # 사전 계산표를 만든 최적화 방식과 같아야 사용 (None = 확인 안 함)
+        self.precomputed_dir = precomputed_dir
+        self.poll_interval = poll_interval
+        self._current = None
+        self._listeners = []
+        self._reload_lock = threading.Lock()   # 리로드는 한 번에 하나만
+        self._seen_mtimes = None
+        self._pending_mtimes = None
+        self._stop = threading.Event()
+        self._watcher = None
+        self.reloads = 0
+        self.last_error = None
+
+    # 읽기는 잠금 없이 참조 하나만 가져감 (교체는 참조 대입 한 번)
+    @property
+    def current(self):
+        return self._current
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _watched_paths(self):
+        paths = data_paths(self.data_dir)
+        if self.snapshot_path:
+            paths.append(self.snapshot_path)
+        if self.precomputed_dir:
+            paths.append(os.path.join(self.precomputed_dir, 'meta.json'))
+        return paths
+
+    def _mtimes(self):
+        return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in self._watched_paths())
+
+    # 새 데이터 생성 → 내용이 같으면 유지(force 제외), 다르면 교체. 반환: (교체 여부, 현재 상태)
+    def reload(self, force=False):
+        with self._reload_lock:
+            mtimes = self._mtimes()
+            try:
+                dataset = load_dataset(self.data_dir, self.snapshot_path, self.rule_table, self.fund_stats,
+                                       self.covariance_model)
+                precomputed_table = _load_precomputed_table(self.precomputed_dir, dataset, self.screening,
+                                                            self.covariance_model, self.rule_digest, self.solver)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self._current is None:
+                    raise
+                logger.warning("데이터 리로드 실패, 기존 데이터 유지 (%s)", self.last_error)
+                return False, self._current
+            self.last_error = None
+            self._seen_mtimes = self._pending_mtimes = mtimes
+
+            old = self._current
+            # 데이터 버전과 사전 계산표 meta(생성 시각 포함)가 모두 같을 때만 유지 → 다시 만든 표도 교체
+            if (old is not None and not force and dataset.version == old.version
+                    and _table_meta(precomputed_table) == _table_meta(old.precomputed_table)):
+                return False, old
+
+            state = DatasetState(
+                generation=old.generation + 1 if old is not None else 1,
+                dataset=dataset,
+                market_versions={
+                    bracket: market_fingerprint(bucket, dataset.fund_universe)
+                    for bracket, bucket in dataset.deposit_index.buckets.items()
+                },
+                precomputed_table=precomputed_table,
+                loaded_at=time.time(),
+                asset_table=build_asset_table(dataset),
+            )
+            self._current = state
+            self.reloads += 1
+            for listener in self._listeners:
+                listener(old, state)
+            return True, state
+
+    # 파일 수정 시각이 바뀐 뒤 한 번 더 같은 값이면 리로드 (쓰는 중인 파일을 읽지 않도록)
+    def poll(self):
+        mtimes = self._mtimes()
+        if mtimes == self._seen_mtimes:
+            return False
+        if mtimes != self._pending_mtimes:
+            self._pending_mtimes = mtimes
+            return False
+        swapped, _ = self.reload()
+        return swapped
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning("데이터 디렉터리 감시 오류: %s", self.last_error)
+
+    def start_watching(self):
+        if self.poll_interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="dataset-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self):
+        state = self._current
+        return {
+            "generation": state.generation if state else None,
+            "dataset_version": state.version if state else None,
+            "source": state.dataset.source if state else None,
+            "fund_stats": state.dataset.fund_stats if state else self.fund_stats,
+            "funds": _fund_summary(state.dataset.fund_report) if state else None,
+            "covariance": _covariance_summary(self.covariance_model, state),
+            "market_versions": dict(state.market_versions) if state else {},
+            "precomputed": len(state.precomputed_table) if state and state.precomputed_table is not None else 0,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(state.loaded_at)) if state else None,
+            "reloads": self.reloads,
+            "watching": self._watcher is not None,
+            "poll_interval": self.poll_interval,
+            "last_error": self.last_error,
+        }
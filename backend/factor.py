@@ -0,0 +1,260 @@
+# factor.py
+# 지수 팩터 공분산: Σ = B·F·Bᵀ + D (B: 펀드별 참고 지수 비중 N×K, F: 지수 공분산 K×K, D: 펀드 고유 분산)
+#   - N×N 행렬을 만들지 않고 Σw = B(F(Bᵀw)) + D·w 로만 계산 → 메모리/반복당 비용 O(N²) → O(NK)
+#   - 지수 공분산은 CSV(IRP_INDEX_COV)에서 로드, 없으면 데이터에서 추정 (지수별 펀드 변동성 + 카테고리 상관관계 규칙)
+#   python factor.py [--data-dir data] [--out data/index_cov.csv]   # 추정한 지수 공분산을 CSV로 저장 (수정 후 사용)
+import argparse
+import hashlib
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+COVARIANCE_MODELS = ('category', 'factor')
+
+IDIO_FLOOR_SHARE = 0.1      # 고유 분산 하한 = 펀드 총분산 × 비율 (지수 분산이 펀드 분산보다 커도 양수 유지)
+DEPOSIT_VARIANCE = 0.001 ** 2
+
+
+# 지수 공분산 (연환산, 라벨 = 매핑지수 티커 또는 공백을 뺀 지수2 이름)
+@dataclass(frozen=True)
+class IndexCovariance:
+    labels: tuple
+    cov: np.ndarray
+    source: str = "derived"     # CSV 경로 또는 "derived"
+
+    def digest(self):
+        h = hashlib.sha1("\x1f".join(self.labels).encode('utf-8'))
+        h.update(self.cov.tobytes())
+        return h.hexdigest()[:12]
+
+
+# 펀드별 참고 지수 (지수1 → 매핑지수 티커, 지수2 → 공백 제거한 이름)
+@dataclass(frozen=True)
+class IndexLinks:
+    primary: tuple
+    primary_weights: np.ndarray
+    secondary: tuple            # 없으면 ''
+    secondary_weights: np.ndarray
+
+    def __len__(self):
+        return len(self.primary)
+
+
+def _label(value):
+    return "".join(value.split()) if isinstance(value, str) else ''
+
+
+def _weights(values, default):
+    weights = np.array([np.nan if value is None else float(value) for value in values], dtype=float)
+    weights[np.isnan(weights)] = default
+    weights.flags.writeable = False
+    return weights
+
+
+# FundTable.attributes(매핑지수, 비중1, 지수2, 비중2) → 지수 연결 (매핑지수가 없으면 None)
+def index_links_from_attributes(attributes, num_funds):
+    if '매핑지수' not in attributes:
+        return None
+    empty = (None,) * num_funds
+    primary = tuple(_label(value) for value in attributes['매핑지수'])
+    secondary = tuple(_label(value) for value in attributes.get('지수2', empty))
+    return IndexLinks(
+        primary=primary,
+        primary_weights=_weights(attributes.get('비중1', empty), 1.0),   # 비중이 없으면 지수 100%
+        secondary=secondary,
+        secondary_weights=_weights(attributes.get('비중2', empty), 0.0),
+    )
+
+
+# 저랭크 + 대각 공분산: ndarray 대신 Sigma 자리에 그대로 넘김 (Sigma @ w 만 사용)
+@dataclass(frozen=True)
+class FactorCovariance:
+    exposures: np.ndarray       # N×K
+    factor_cov: np.ndarray      # K×K
+    idio_var: np.ndarray        # N
+    labels: tuple = ()
+    report: dict = None
+
+    __array_ufunc__ = None      # w @ Sigma 도 __rmatmul__ 로 처리
+
+    @property
+    def shape(self):
+        return (len(self.idio_var), len(self.idio_var))
+
+    def __len__(self):
+        return len(self.idio_var)
+
+    def __matmul__(self, w):
+        return self.exposures @ (self.factor_cov @ (self.exposures.T @ w)) + (
+            self.idio_var * w if np.ndim(w) == 1 else self.idio_var[:, None] * w)
+
+    def __rmatmul__(self, w):   # 대칭
+        return (self @ np.transpose(w)).T
+
+    def diagonal(self):
+        return np.einsum('ik,kl,il->i', self.exposures, self.factor_cov, self.exposures) + self.idio_var
+
+    # 일부 자산만 남긴 공분산 (후보 축소용)
+    def take(self, indices):
+        return FactorCovariance(self.exposures[indices], self.factor_cov, self.idio_var[indices], self.labels)
+
+    # 앞쪽에 다른 자산과 상관없는 자산(예금)을 붙임
+    def prepend_diagonal(self, variances):
+        variances = np.asarray(variances, dtype=float)
+        exposures = np.vstack([np.zeros((len(variances), self.exposures.shape[1])), self.exposures])
+        return FactorCovariance(exposures, self.factor_cov, np.concatenate([variances, self.idio_var]), self.labels)
+
+    def to_dense(self):
+        return self.exposures @ self.factor_cov @ self.exposures.T + np.diag(self.idio_var)
+
+    # 지문 계산용 (datastore.market_fingerprint)
+    def tobytes(self):
+        return self.exposures.tobytes() + self.factor_cov.tobytes() + self.idio_var.tobytes()
+
+
+# 공분산 행렬이 양의 준정부호가 되도록 음의 고유값을 0으로 (대각 원소는 유지)
+def _nearest_psd(matrix):
+    eigvals, eigvecs = np.linalg.eigh((matrix + matrix.T) / 2)
+    if eigvals.min() >= 0:
+        return matrix
+    fixed = (eigvecs * np.maximum(eigvals, 0)) @ eigvecs.T
+    scale = np.sqrt(np.diag(matrix) / np.maximum(np.diag(fixed), 1e-300))
+    return fixed * np.outer(scale, scale)
+
+
+# 데이터에서 지수 공분산 추정: 지수 변동성 = 연결된 펀드 변동성 중앙값, 지수 간 상관 = 주 카테고리 간 규칙 값
+def derive_index_covariance(links, std_devs, category_codes, rule_table):
+    labels = tuple(sorted({label for label in links.primary if label}))
+    primary = np.array(links.primary, dtype=object)
+    vols = np.empty(len(labels))
+    label_categories = np.empty(len(labels), dtype=np.intp)
+    for k, label in enumerate(labels):
+        members = primary == label
+        vols[k] = np.median(std_devs[members])
+        label_categories[k] = np.bincount(category_codes[members]).argmax()
+    corr = np.array(rule_table, dtype=float)[label_categories[:, None], label_categories[None, :]]
+    np.fill_diagonal(corr, 1.0)
+    cov = _nearest_psd(np.outer(vols, vols) * corr)
+    cov.flags.writeable = False
+    return IndexCovariance(labels=labels, cov=cov, source="derived")
+
+
+# 정사각 CSV (첫 열 = 지수 라벨, 헤더 = 같은 라벨 순서, 값 = 연환산 공분산)
+def load_index_covariance(path):
+    import pandas as pd
+
+    df = pd.read_csv(path, index_col=0, encoding='utf-8')
+    labels = tuple(_label(str(label)) for label in df.index)
+    if tuple(_label(str(col)) for col in df.columns) != labels:
+        raise ValueError(f"지수 공분산 파일의 행/열 라벨이 일치하지 않습니다: {path}")
+    cov = df.to_numpy(dtype=float)
+    if np.isnan(cov).any() or not np.allclose(cov, cov.T, atol=1e-10):
+        raise ValueError(f"지수 공분산 행렬이 비어 있거나 대칭이 아닙니다: {path}")
+    if np.linalg.eigvalsh(cov).min() < -1e-10:
+        raise ValueError(f"지수 공분산 행렬이 양의 준정부호가 아닙니다: {path}")
+    cov = np.ascontiguousarray(cov)
+    cov.flags.writeable = False
+    return IndexCovariance(labels=labels, cov=cov, source=path)
+
+
+def save_index_covariance(index_cov, path):
+    import pandas as pd
+
+    pd.DataFrame(index_cov.cov, index=list(index_cov.labels), columns=list(index_cov.labels)).to_csv(
+        path, encoding='utf-8')
+
+
+# 펀드별 지수 비중 행렬 (N×K, 열 = labels 순서) 과 어느 지수와도 연결되지 않은 펀드 수
+def index_exposures(links, labels):
+    column_of = {label: k for k, label in enumerate(labels)}
+    num_funds = len(links)
+    exposures = np.zeros((num_funds, len(labels)))
+    unmatched = 0
+    for i in range(num_funds):
+        matched = False
+        for label, weight in ((links.primary[i], links.primary_weights[i]),
+                              (links.secondary[i], links.secondary_weights[i])):
+            if label in column_of and weight > 0:
+                exposures[i, column_of[label]] += weight
+                matched = True
+        unmatched += not matched
+    return exposures, unmatched
+
+
+# 펀드 총분산(std_devs²) 중 지수로 설명되지 않는 부분을 고유 분산으로
+def build_factor_covariance(links, std_devs, index_cov):
+    exposures, unmatched = index_exposures(links, index_cov.labels)
+    total_var = np.asarray(std_devs, dtype=float) ** 2
+    systematic = np.einsum('ik,kl,il->i', exposures, index_cov.cov, exposures)
+    floor = IDIO_FLOOR_SHARE * total_var
+    idio_var = np.maximum(total_var - systematic, floor)
+    for arr in (exposures, idio_var):
+        arr.flags.writeable = False
+    return FactorCovariance(
+        exposures=exposures,
+        factor_cov=index_cov.cov,
+        idio_var=idio_var,
+        labels=index_cov.labels,
+        report={
+            "factors": len(index_cov.labels),
+            "index_cov": index_cov.source,
+            "unmatched_funds": int(unmatched),
+            "idio_floored": int((total_var - systematic < floor).sum()),
+        },
+    )
+
+
+# 공분산 모델 설정: 'category'(카테고리 상관관계 규칙, 기본) 또는 'factor'(지수 팩터)
+@dataclass(frozen=True)
+class CovarianceModel:
+    kind: str = 'category'
+    index_cov: IndexCovariance = None   # 'factor'에서 None이면 데이터에서 추정
+
+    def __post_init__(self):
+        if self.kind not in COVARIANCE_MODELS:
+            raise ValueError(f"지원하지 않는 공분산 모델입니다: {self.kind} (가능: {', '.join(COVARIANCE_MODELS)})")
+
+    # IRP_COVARIANCE_MODEL=factor, IRP_INDEX_COV=지수 공분산 CSV (기본: <data_dir>/index_cov.csv, 없으면 추정)
+    @classmethod
+    def from_env(cls, data_dir='data', environ=os.environ):
+        kind = environ.get('IRP_COVARIANCE_MODEL', 'category')
+        path = environ.get('IRP_INDEX_COV', os.path.join(data_dir, 'index_cov.csv'))
+        index_cov = load_index_covariance(path) if kind == 'factor' and os.path.exists(path) else None
+        return cls(kind=kind, index_cov=index_cov)
+
+    def as_dict(self):
+        if self.kind == 'category':
+            return {"kind": self.kind}
+        return {"kind": self.kind, "index_cov": self.index_cov.digest() if self.index_cov is not None else "derived"}
+
+    def build(self, links, std_devs, category_codes, rule_table):
+        index_cov = self.index_cov
+        if index_cov is None:
+            index_cov = derive_index_covariance(links, np.asarray(std_devs, dtype=float), category_codes, rule_table)
+        return build_factor_covariance(links, std_devs, index_cov)
+
+
+def main():
+    from correlation import build_rule_table
+    from snapshot import read_csv_dataset
+
+    parser = argparse.ArgumentParser(description="지수 공분산 추정 → CSV (IRP_INDEX_COV로 사용)")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--out", default=None, help="저장 경로 (기본: <data-dir>/index_cov.csv)")
+    parser.add_argument("--fund-stats", default=os.environ.get('IRP_FUND_STATS', 'period'))
+    args = parser.parse_args()
+
+    universe = read_csv_dataset(args.data_dir, fund_stats=args.fund_stats).fund_universe
+    if universe.index_links is None:
+        raise SystemExit("[ERROR] 펀드 데이터에 매핑지수 컬럼이 없습니다.")
+    index_cov = derive_index_covariance(universe.index_links, universe.std_devs, universe.category_codes,
+                                        build_rule_table())
+    out_path = args.out or os.path.join(args.data_dir, 'index_cov.csv')
+    save_index_covariance(index_cov, out_path)
+    factor_cov = build_factor_covariance(universe.index_links, universe.std_devs, index_cov)
+    print(f"[FACTOR] 지수 {len(index_cov.labels)}개 → {out_path} (펀드 {len(universe)}개, {factor_cov.report})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# funds.py
+# 펀드 CSV 로더: 청크 단위로 읽고 dtype을 고정, 수익률 컬럼은 헤더에서 위치를 1회만 결정, 거른 행은 사유와 함께 보고
+#   - 기대수익률/변동성은 기간별 수익률로 추정 (기본, 'period')
+#   - fund_stats='index'면 지수 기반 연환산 값(지수_연환산수익률/변동성)을 쓰되,
+#     값이 없거나 연 수치로 보기 어려운 범위면 기간별 추정으로 대체하고 해당 행을 보고
+#   - 숫자 컬럼은 문자열로 읽어 청크별로 변환 (숫자가 아닌 값이 있는 행은 제외 사유와 함께 보고)
+import logging
+from dataclasses import dataclass, field
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FUND_STATS_SOURCES = ('index', 'period')
+
+INDEX_RETURN_COLUMN = '지수_연환산수익률'
+INDEX_VOL_COLUMN = '지수_연환산변동성'
+TEXT_COLUMNS = ('상품명', '운용사', '매핑지수', '티커', '지수1', '지수2')
+WEIGHT_COLUMNS = ('비중1', '비중2')
+
+# 기대수익률 추정에 쓰는 기간 (긴 기간 우선) 및 변동성 추정에 쓰는 단기 기간
+RETURN_PERIODS = (('3년', 3), ('2년', 2), ('1년', 1), ('6개월', 0.5), ('3개월', 0.25), ('1개월', 1 / 12))
+STD_PERIODS = ('1개월', '3개월', '6개월', '1년')
+
+# 지수 기반 값의 허용 범위 (연 수치로 그럴듯한 범위, 벗어나면 데이터 오류로 보고 기간별 추정으로 대체)
+INDEX_RETURN_BOUNDS = (-0.3, 0.3)
+INDEX_VOL_BOUNDS = (0.0, 0.6)
+MISSING_VALUES = ('-', '')      # 결측으로 보는 값 (숫자가 아니어도 제외 사유가 아님)
+
+MIN_EXPECTED_RETURN = 0.01
+DEFAULT_STD = 0.15
+MIN_STD = 0.01
+
+
+# 헤더에서 한 번만 결정한 컬럼 위치
+@dataclass(frozen=True)
+class FundColumns:
+    header: tuple
+    text: dict              # 컬럼명 → 위치 (없으면 제외)
+    weights: dict
+    return_periods: tuple   # ((연수, (위치, ...)), ...) 긴 기간 순
+    std_periods: tuple      # (위치, ...)
+    index_return: int = None
+    index_vol: int = None
+
+    def numeric_positions(self):
+        positions = [pos for _, cols in self.return_periods for pos in cols] + list(self.std_periods)
+        positions += list(self.weights.values())
+        positions += [pos for pos in (self.index_return, self.index_vol) if pos is not None]
+        return sorted(set(positions))
+
+
+def resolve_fund_columns(header):
+    header = tuple(header)
+
+    def period_positions(key):
+        return tuple(pos for pos, col in enumerate(header) if key in col and '수익률' in col and not col.startswith('지수'))
+
+    if '상품명' not in header:
+        raise ValueError("펀드 데이터에 '상품명' 컬럼이 없습니다.")
+    return FundColumns(
+        header=header,
+        text={col: header.index(col) for col in TEXT_COLUMNS if col in header},
+        weights={col: header.index(col) for col in WEIGHT_COLUMNS if col in header},
+        return_periods=tuple((years, period_positions(key)) for key, years in RETURN_PERIODS),
+        std_periods=tuple(pos for key in STD_PERIODS for pos in period_positions(key)),
+        index_return=header.index(INDEX_RETURN_COLUMN) if INDEX_RETURN_COLUMN in header else None,
+        index_vol=header.index(INDEX_VOL_COLUMN) if INDEX_VOL_COLUMN in header else None,
+    )
+
+
+@dataclass(frozen=True)
+class FundTable:
+    names: tuple                # 상품명 (거른 행 제외, 파일 순서)
+    expected_returns: np.ndarray
+    std_devs: np.ndarray
+    stats_source: tuple         # 행별 'index' 또는 'period'
+    attributes: dict            # 텍스트/비중 컬럼명 → 값 튜플 (매핑지수, 티커, 지수1, 비중1 …)
+    total_rows: int
+    rejected: list = field(default_factory=list)         # [(행 번호, 상품명, 사유)]
+    index_fallbacks: list = field(default_factory=list)  # 지수 값 대신 기간별 추정을 쓴 행
+
+    def __len__(self):
+        return len(self.names)
+
+    def report(self):
+        return {
+            "rows": self.total_rows,
+            "loaded": len(self.names),
+            "index_stats": sum(source == 'index' for source in self.stats_source),
+            "period_stats": sum(source == 'period' for source in self.stats_source),
+            "rejected": [{"row": row, "상품명": name, "사유": reason} for row, name, reason in self.rejected],
+            "index_fallbacks": [{"row": row, "상품명": name, "사유": reason}
+                                for row, name, reason in self.index_fallbacks],
+        }
+
+
+def _period_stats(values, columns, positions):
+    # 기대수익률: 긴 기간부터 처음으로 값이 있는 수익률을 연환산
+    num_rows = values.shape[0]
+    expected_returns = np.full(num_rows, np.nan)
+    found = np.zeros(num_rows, dtype=bool)
+    for years, cols in columns.return_periods:
+        for pos in cols:
+            vals = values[:, positions[pos]]
+            hit = ~found & ~np.isnan(vals)
+            expected_returns[hit] = (1 + vals[hit] / 100) ** (1 / years) - 1
+            found |= hit
+
+    # 변동성: 단기 수익률들의 표준편차 (값이 하나도 없으면 기본값)
+    std_devs = np.full(num_rows, DEFAULT_STD)
+    if columns.std_periods:
+        std_matrix = values[:, [positions[pos] for pos in columns.std_periods]] / 100
+        has_value = ~np.isnan(std_matrix).all(axis=1)
+        if has_value.any():
+            std_devs[has_value] = np.maximum(np.nanstd(std_matrix[has_value], axis=1), MIN_STD)
+    return expected_returns, std_devs
+
+
+def _index_problem(index_return, index_vol):
+    if np.isnan(index_return) or np.isnan(index_vol):
+        return "지수 기반 수익률/변동성 없음"
+    if not INDEX_RETURN_BOUNDS[0] <= index_return <= INDEX_RETURN_BOUNDS[1]:
+        return f"지수 연환산수익률 {index_return:.4g} 범위 밖"
+    if not INDEX_VOL_BOUNDS[0] < index_vol <= INDEX_VOL_BOUNDS[1]:
+        return f"지수 연환산변동성 {index_vol:.4g} 범위 밖"
+    return None
+
+
+# 숫자 컬럼 → 실수 행렬 (변환 실패 = 결측), 결측 표기가 아닌데 변환에 실패한 칸 = True
+def _numeric_values(chunk, numeric_columns):
+    import pandas as pd
+
+    values = np.full((len(chunk), len(numeric_columns)), np.nan)
+    invalid = np.zeros(values.shape, dtype=bool)
+    for i, col in enumerate(numeric_columns):
+        raw = chunk[col].astype(object)
+        converted = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        values[:, i] = converted
+        invalid[:, i] = np.isnan(converted) & ~(raw.isna() | raw.isin(MISSING_VALUES)).to_numpy(dtype=bool)
+    return values, invalid
+
+
+def _chunk_stats(chunk, columns, fund_stats, first_row):
+    numeric_positions = columns.numeric_positions()
+    positions = {pos: i for i, pos in enumerate(numeric_positions)}
+    numeric_columns = [columns.header[pos] for pos in numeric_positions]
+    values, invalid = _numeric_values(chunk, numeric_columns)
+    names = chunk[columns.header[columns.text['상품명']]].to_numpy(dtype=object, na_value=None)
+
+    expected_returns, std_devs = _period_stats(values, columns, positions)
+    source = np.full(len(chunk), 'period', dtype=object)
+    fallbacks = []
+    if fund_stats == 'index' and columns.index_return is not None and columns.index_vol is not None:
+        index_return = values[:, positions[columns.index_return]]
+        index_vol = values[:, positions[columns.index_vol]]
+        valid = ((index_return >= INDEX_RETURN_BOUNDS[0]) & (index_return <= INDEX_RETURN_BOUNDS[1])
+                 & (index_vol > INDEX_VOL_BOUNDS[0]) & (index_vol <= INDEX_VOL_BOUNDS[1]))
+        expected_returns[valid] = index_return[valid]
+        std_devs[valid] = np.maximum(index_vol[valid], MIN_STD)
+        source[valid] = 'index'
+        for i in np.flatnonzero(~valid):
+            fallbacks.append((first_row + int(i), names[i], _index_problem(index_return[i], index_vol[i])))
+
+    # 상품명이 없거나, 숫자 컬럼에 숫자가 아닌 값이 있거나, 어떤 기간의 수익률도 없는 행은 제외
+    rejected = []
+    missing_name = np.array([not isinstance(name, str) or not name.strip() for name in names], dtype=bool)
+    not_numeric = invalid.any(axis=1)
+    missing_return = np.isnan(expected_returns) & (source == 'period')
+    for i in np.flatnonzero(missing_name | not_numeric | missing_return):
+        if missing_name[i]:
+            reason = "상품명 없음"
+        elif not_numeric[i]:
+            reason = "숫자가 아닌 값 (" + ", ".join(np.asarray(numeric_columns, dtype=object)[invalid[i]]) + ")"
+        else:
+            reason = "수익률 데이터 없음"
+        rejected.append((first_row + int(i), names[i] if not missing_name[i] else None, reason))
+    keep = ~(missing_name | not_numeric | missing_return)
+    fallbacks = [entry for entry in fallbacks if keep[entry[0] - first_row]]
+
+    attributes = {
+        col: chunk[columns.header[pos]].to_numpy(dtype=object, na_value=None)[keep]
+        for col, pos in {**columns.text, **columns.weights}.items()
+    }
+    return (names[keep], np.maximum(expected_returns[keep], MIN_EXPECTED_RETURN), std_devs[keep], source[keep],
+            attributes, rejected, fallbacks)
+
+
+def _plain(value):
+    value = value.item() if isinstance(value, np.generic) else value
+    return None if isinstance(value, float) and np.isnan(value) else value
+
+
+def _collect(chunks, columns, fund_stats):
+    if fund_stats not in FUND_STATS_SOURCES:
+        raise ValueError(f"지원하지 않는 펀드 통계 기준입니다: {fund_stats} (가능: {', '.join(FUND_STATS_SOURCES)})")
+    parts = []
+    total_rows = 0
+    for chunk in chunks:
+        parts.append(_chunk_stats(chunk, columns, fund_stats, total_rows))
+        total_rows += len(chunk)
+
+    def joined(i, dtype=float):
+        return np.concatenate([part[i] for part in parts]) if parts else np.zeros(0, dtype=dtype)
+
+    expected_returns, std_devs = joined(1), joined(2)
+    expected_returns.flags.writeable = False
+    std_devs.flags.writeable = False
+    attribute_names = list(columns.text) + list(columns.weights)
+    table = FundTable(
+        names=tuple(joined(0, object).tolist()),
+        expected_returns=expected_returns,
+        std_devs=std_devs,
+        stats_source=tuple(joined(3, object).tolist()),
+        attributes={col: tuple(_plain(v) for part in parts for v in part[4][col]) for col in attribute_names},
+        total_rows=total_rows,
+        rejected=[entry for part in parts for entry in part[5]],
+        index_fallbacks=[entry for part in parts for entry in part[6]],
+    )
+    if table.rejected:
+        logger.warning("펀드 %d개 행 제외: %s", len(table.rejected), _row_reasons(table.rejected))
+    if table.index_fallbacks:
+        logger.warning("펀드 %d개 행 지수 값 미사용 (기간별 추정): %s",
+                       len(table.index_fallbacks), _row_reasons(table.index_fallbacks))
+    return table
+
+
+# 보고용 행 목록 (앞 5개만)
+def _row_reasons(entries, limit=5):
+    return ", ".join(f"{row}행({reason})" for row, _, reason in entries[:limit]) + (" …" if len(entries) > limit else "")
+
+
+# 숫자 컬럼도 문자열로 읽음 (잘못된 칸 하나로 파일 전체가 실패하지 않도록 청크별로 변환)
+def _dtypes(columns):
+    return {columns.header[pos]: 'string'
+            for pos in set(columns.numeric_positions()) | set(columns.text.values())}
+
+
+# CSV를 청크 단위로 읽어 펀드 표 생성 ('-'·빈 칸은 결측, 그 밖의 숫자가 아닌 값이 있는 행은 제외)
+def load_fund_table(path, fund_stats='period', chunksize=1000, encoding='utf-8'):
+    import pandas as pd
+
+    columns = resolve_fund_columns(pd.read_csv(path, nrows=0, encoding=encoding).columns)
+    usecols = sorted(set(columns.numeric_positions()) | set(columns.text.values()))
+    chunks = pd.read_csv(path, usecols=usecols, dtype=_dtypes(columns), na_values=list(MISSING_VALUES),
+                         chunksize=chunksize, encoding=encoding)
+    return _collect(chunks, columns, fund_stats)
+
+
+# 이미 읽은 DataFrame → 펀드 표 (CSV 로더와 같은 규칙)
+def fund_table_from_frame(df, fund_stats='period'):
+    return _collect([df], resolve_fund_columns(df.columns), fund_stats)
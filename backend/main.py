@@ -1,29 +1,104 @@
 # main.py
-import matplotlib
-matplotlib.use("Agg")
-matplotlib.rcParams["font.family"] = "Malgun Gothic"
+import time
+_IMPORT_STARTED = time.perf_counter()
 
+import asyncio
+import base64
+import hashlib
+import json
 import logging
-from io import BytesIO
+from contextlib import asynccontextmanager
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import re
+import secrets
+import numpy as np
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict
-from fastapi.responses import JSONResponse
-
-from utils import calculate_A_from_survey, filter_best_principal_products_by_age_cumsum
-from optimizer import calculate_er_sigma, optimize_portfolio, get_alpha_by_A
+from typing import Dict, List, Optional
+
+from cache import ResultCache
+from datastore import DatasetManager
+from rendering import ChartRenderer
+from utils import TARGET_RISKY_MAPPING, age_bracket, get_target_risky_ratio, parse_user_age, score_answers
+from correlation import build_rule_table, load_correlation_rules
+from factor import CovarianceModel
+from metrics import MetricsRegistry, SlowRequestProfiler
+from optimizer import IRP_MAX, calculate_er_sigma, get_alpha_by_A
+from projection import default_horizon, load_index_series, project_portfolio, replay_portfolio
+from screening import ScreeningConfig, screen_funds
+from warmstart import NEIGHBOR_WARM_START_SOLVERS, WarmStartStore, asset_fingerprint
+from workers import PoolSaturated, SolverPool, frontier_in_worker, solve_in_worker
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# 시작 시간 측정: 단계별 소요 시간(ms), IRP_STARTUP_BUDGET_MS 초과 시 경고
+STARTUP_BUDGET_MS = float(os.environ.get('IRP_STARTUP_BUDGET_MS', 1500))
+startup_timings = {"imports": round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)}
+
+def startup_report():
+    total_ms = round(sum(startup_timings.values()), 1)
+    return {
+        "stages_ms": dict(startup_timings),
+        "total_ms": total_ms,
+        "budget_ms": STARTUP_BUDGET_MS,
+        "within_budget": total_ms <= STARTUP_BUDGET_MS,
+        "dataset_source": dataset_manager.current.dataset.source,
+    }
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+    solver_pool.start()
+    dataset_manager.start_watching()
+    startup_timings["solver_pool"] = round((time.perf_counter() - started) * 1000, 1)
+    report = startup_report()
+    stages = ", ".join(f"{stage} {ms:.0f}ms" for stage, ms in report["stages_ms"].items())
+    if report["within_budget"]:
+        logger.info("[STARTUP] %s → 합계 %.0fms (예산 %.0fms)", stages, report["total_ms"], STARTUP_BUDGET_MS)
+    else:
+        logger.warning("[STARTUP] %s → 합계 %.0fms, 예산 %.0fms 초과", stages, report["total_ms"], STARTUP_BUDGET_MS)
+    yield
+    dataset_manager.stop_watching()
+    solver_pool.shutdown()
+
+# 응답 JSON 직렬화: orjson이 있으면 사용 (없으면 표준 json, 공백 없이)
+try:
+    import orjson
+
+    def json_bytes(content):
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    def json_bytes(content):
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return json_bytes(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# 요청 수/처리 시간 (경로는 라우트 템플릿 기준, 예: /plot/{portfolio_id}) + 표본 프로파일링
+@app.middleware("http")
+async def observe_requests(request, call_next):
+    profiler = slow_request_profiler.start()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        requests_total.inc(method=request.method, path=path, status=status)
+        request_seconds.observe(elapsed, path=path)
+        if profiler is not None:
+            slow_request_profiler.stop(profiler, f"{request.method} {path}", elapsed * 1000)
 
 origins = ["https://irp-portfolio.vercel.app"]
 
@@ -35,10 +110,400 @@ app.add_middleware(
     allow_headers=["*"],
 )
 DATA_DIR = 'data'
-principal_df = pd.read_csv(os.path.join(DATA_DIR, 'irp.csv'), encoding='utf-8')
-non_principal_df = pd.read_csv(os.path.join(DATA_DIR, 'update_irp_non_with_index.csv'))
-risk_weight_df = pd.read_csv(os.path.join(DATA_DIR, 'final_weight_table.csv'), encoding='utf-8')
-investor_df = pd.read_csv(os.path.join(DATA_DIR, 'invest_score.csv'), encoding='utf-8')
+
+# 데이터 스냅샷 (python snapshot.py 로 생성, 없거나 CSV와 버전이 다르면 CSV에서 로드)
+SNAPSHOT_PATH = os.environ.get('IRP_SNAPSHOT', os.path.join(DATA_DIR, 'snapshot.npz'))
+
+# 상관관계 규칙 교체: IRP_CORRELATION_RULES=규칙 CSV 경로 (없으면 기본 규칙)
+CORRELATION_RULES_PATH = os.environ.get('IRP_CORRELATION_RULES')
+correlation_rules = load_correlation_rules(CORRELATION_RULES_PATH) if CORRELATION_RULES_PATH else None
+
+# 공분산 모델: IRP_COVARIANCE_MODEL='category'(카테고리 상관관계, 기본) 또는 'factor'(지수 팩터, N×N 행렬 없음)
+# 팩터 모델의 지수 공분산은 IRP_INDEX_COV(기본 data/index_cov.csv), 없으면 데이터에서 추정
+COVARIANCE_MODEL = CovarianceModel.from_env(DATA_DIR)
+
+# 최적화 솔버 백엔드: 'qp'(사영 경사법, 기본) 또는 'slsqp'
+SOLVER_BACKEND = os.environ.get('IRP_SOLVER', 'qp')
+
+# 최적화 전 펀드 후보 축소 (IRP_SCREEN_DOMINANCE / IRP_SCREEN_PER_CATEGORY / IRP_SCREEN_TOP_N)
+SCREENING = ScreeningConfig.from_env()
+screening_stats = {"solves": 0, "funds_total": 0, "funds_kept": 0, "pruned": {}}
+
+# 최적화 초기값 저장소 (가장 가까운 기존 해에서 시작)
+warm_start_store = WarmStartStore()
+
+# 최적화 전용 프로세스 풀 (IRP_SOLVER_WORKERS=0 이면 스레드에서 실행)
+solver_pool = SolverPool(
+    max_workers=int(os.environ['IRP_SOLVER_WORKERS']) if 'IRP_SOLVER_WORKERS' in os.environ else None,
+    max_pending=int(os.environ['IRP_SOLVER_MAX_PENDING']) if 'IRP_SOLVER_MAX_PENDING' in os.environ else None,
+    blas_threads=int(os.environ.get('IRP_BLAS_THREADS', 1)),
+)
+
+# 차트 렌더러 (자산 구성별 PNG/SVG 바이트 캐시)
+chart_renderer = ChartRenderer(
+    max_entries=int(os.environ.get('IRP_CHART_CACHE_SIZE', 256)),
+    font_family=os.environ.get('IRP_CHART_FONT', 'Malgun Gothic'),
+)
+
+# 최적화 결과 캐시: (연령 구간별 최적화 입력 지문, 연령 구간, A, 투자성향 레벨, 목표 비중, alpha) → (자산명, 비중)
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('IRP_RESULT_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.environ.get('IRP_RESULT_CACHE_TTL', 3600)),
+)
+
+# 연령 구간별 최적화 입력 (ER, Sigma, 자산명, 보장형/비보장형 위치): 시장 버전 → 입력 (데이터 교체 시 정리)
+market_cache = ResultCache(max_entries=16, ttl_seconds=0)
+
+# 추천 결과 보관소: portfolio_id → (자산명, 비중). /recommend 후 /plot/{portfolio_id} 로 같은 해를 다시 조회
+portfolio_store = ResultCache(
+    max_entries=int(os.environ.get('IRP_PORTFOLIO_STORE_SIZE', 4096)),
+    ttl_seconds=float(os.environ.get('IRP_PORTFOLIO_TTL', 1800)),
+)
+
+# 세션별 마지막 추천 상태 (X-Session-Token 헤더, 설문을 한 항목씩 바꿔 다시 제출하는 흐름용)
+session_store = ResultCache(
+    max_entries=int(os.environ.get('IRP_SESSION_STORE_SIZE', 10000)),
+    ttl_seconds=float(os.environ.get('IRP_SESSION_TTL', 1800)),
+)
+
+# 지표 (/metrics, Prometheus 텍스트 형식): 단계별 시간, 솔버 반복/실패, 포트폴리오 출처, 캐시 적중률, 대기열 길이
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "irp_stage_seconds", "추천 단계별 소요 시간(초): scoring, er_sigma, solve, fallback, solver_pool, render, frontier, projection", ("stage",))
+solves_total = metrics.counter("irp_solves_total", "최적화 실행 수 (outcome: success 또는 fallback)", ("solver", "outcome"))
+solver_iterations = metrics.histogram("irp_solver_iterations", "최적화 반복 횟수", ("solver",),
+                                      buckets=(5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+portfolio_source_total = metrics.counter(
+    "irp_portfolio_source_total", "포트폴리오 출처 (cache, deposit, precomputed, solve)", ("source",))
+requests_total = metrics.counter("irp_requests_total", "HTTP 요청 수", ("method", "path", "status"))
+request_seconds = metrics.histogram("irp_request_seconds", "HTTP 요청 처리 시간(초)", ("path",))
+session_requests_total = metrics.counter(
+    "irp_session_requests_total", "세션 재제출 처리 방식 (unchanged, cache, warm, cold)", ("outcome",))
+_caches = {"result": result_cache, "chart": chart_renderer.cache, "portfolio_store": portfolio_store,
+           "session": session_store}
+metrics.gauge("irp_cache_hit_ratio", "캐시 적중률", ("cache",),
+              lambda: [((name,), cache.stats()["hit_ratio"]) for name, cache in _caches.items()])
+metrics.gauge("irp_cache_entries", "캐시 항목 수", ("cache",),
+              lambda: [((name,), len(cache)) for name, cache in _caches.items()])
+metrics.gauge("irp_solver_queue_depth", "최적화 대기열 길이 (실행 중 포함)", (), lambda: [((), solver_pool.pending)])
+metrics.gauge("irp_solver_pool_events", "최적화 풀 누적 이벤트 (submitted, coalesced, rejected)", ("event",),
+              lambda: [((event,), solver_pool.stats()[event]) for event in ("submitted", "coalesced", "rejected")])
+metrics.gauge("irp_dataset_generation", "현재 데이터셋 세대 번호", (), lambda: [((), dataset_manager.current.generation)])
+
+# 느린 요청 프로파일링: IRP_PROFILE_SAMPLE_RATE 비율(기본 0 = 끔)만 측정, IRP_PROFILE_SLOW_MS 이상이면 보관
+slow_request_profiler = SlowRequestProfiler(
+    sample_rate=float(os.environ.get('IRP_PROFILE_SAMPLE_RATE', 0)),
+    threshold_ms=float(os.environ.get('IRP_PROFILE_SLOW_MS', 500)),
+    keep=int(os.environ.get('IRP_PROFILE_KEEP', 20)),
+)
+
+# 사전 계산된 추천표 (python precompute.py 로 생성, 없으면 매번 최적화)
+PRECOMPUTED_DIR = os.environ.get('IRP_PRECOMPUTED_DIR', os.path.join(DATA_DIR, 'precomputed'))
+
+# 데이터셋 관리자: IRP_DATA_WATCH_INTERVAL(초)마다 데이터 디렉터리를 확인해 바뀌면 다시 로드 (0이면 감시 안 함)
+dataset_manager = DatasetManager(
+    data_dir=DATA_DIR,
+    snapshot_path=SNAPSHOT_PATH,
+    rule_table=build_rule_table(correlation_rules),
+    precomputed_dir=PRECOMPUTED_DIR,
+    poll_interval=float(os.environ.get('IRP_DATA_WATCH_INTERVAL', 30)),
+    fund_stats=os.environ.get('IRP_FUND_STATS', 'period'),  # 펀드 기대수익률/변동성: 'index'(지수 기반) 또는 'period'
+    screening=SCREENING,
+    covariance_model=COVARIANCE_MODEL,
+    solver=SOLVER_BACKEND,
+)
+
+# 데이터 교체 시: 최적화 입력이 바뀐 연령 구간의 결과만 무효화
+# (포트폴리오 보관소/차트 캐시는 이미 내려준 결과라 유지, 초기값 저장소는 지문이 달라 자연히 조회되지 않음)
+def _on_dataset_swap(old, new):
+    current = set(new.market_versions.values())
+    removed = result_cache.invalidate(lambda key: key[0] not in current)
+    market_cache.invalidate(lambda key: key not in current)
+    changed = [bracket for bracket, version in new.market_versions.items()
+               if old is None or old.market_versions.get(bracket) != version]
+    logger.info("[DATA] 세대 %d: 데이터 버전 %s 로드 (%s, 사전 계산표 %s, 변경 구간 %s, 캐시 %d건 무효화)",
+                new.generation, new.version, new.dataset.source,
+                f"{len(new.precomputed_table)}건" if new.precomputed_table is not None else "없음",
+                changed, removed)
+
+dataset_manager.add_listener(_on_dataset_swap)
+
+# 데이터 로드 + 사용자와 무관한 펀드 ER/Sigma 사전 계산 (이후 교체는 감시 스레드 또는 /admin/reload)
+def load_datasets(force=False):
+    started = time.perf_counter()
+    swapped, state = dataset_manager.reload(force=force)
+    startup_timings.setdefault("datasets", round((time.perf_counter() - started) * 1000, 1))
+    return swapped, state
+
+load_datasets()
+
+# 최적화 입력을 결정하는 정규화된 설문 프로필
+def canonical_key(user, A, target_risky_ratio, alpha, state):
+    bracket = age_bracket(parse_user_age(user.age_group))
+    return (
+        state.market_versions[bracket],
+        bracket,
+        round(A, 2),
+        user.answers.get("투자성향"),
+        target_risky_ratio,
+        alpha,
+    )
+
+# 설문 → A, 목표 비중, alpha 및 캐시 키 (이후 단계도 여기서 고정한 데이터셋을 사용)
+# previous: 같은 세션의 직전 점수 내역 (바뀐 항목만 다시 계산)
+def score_survey(user, state=None, previous=None):
+    state = state or dataset_manager.current
+    with stage_seconds.time(stage="scoring"):
+        survey_score, changed = score_answers(state.dataset.survey_index, user.age_group, user.answers, previous)
+        user.answers["투자성향"] = survey_score.investor_level
+    A, warnings, investor_score = survey_score.A, survey_score.warnings, survey_score.investor_score
+    investment_type = user.answers.get("투자성향설문")
+    target_risky_ratio = get_target_risky_ratio(investment_type)
+    alpha = get_alpha_by_A(A)
+    return {
+        "calculated_A": A,
+        "investor_score": investor_score,
+        "investment_type": investment_type,
+        "target_risky_ratio": target_risky_ratio,
+        "alpha": alpha,
+        "warnings": warnings,
+        "key": canonical_key(user, A, target_risky_ratio, alpha, state),
+        "dataset": state,
+        "survey_score": survey_score,
+        "changed_items": changed,
+    }
+
+def _remember(key, portfolio):
+    asset_names, weights = portfolio
+    weights = np.array(weights, dtype=float)
+    weights.flags.writeable = False
+    portfolio = (tuple(asset_names), weights)
+    result_cache.put(key, portfolio)
+    return portfolio
+
+# 안정형: 금리 누적비율 상위 예금에 금리 비례 배분
+def select_deposit_portfolio(user, state):
+    logger.debug("안정형 투자자 - 예금 상품 선택 중")
+    user_age = parse_user_age(user.age_group)
+    deposits = state.dataset.deposit_index.bucket(user_age)
+    selected = deposits.select_by_cumsum(cumsum_threshold=0.9)
+    rates = deposits.ranked_rates[selected]
+    total_rate = rates.sum()
+
+    ranked_names = state.asset_table.ranked_deposit_names[age_bracket(user_age)]
+    names = tuple(ranked_names[i] for i in selected)
+    weights = rates / total_rate if total_rate > 0 else np.full(len(rates), 1 / max(len(rates), 1))
+    return names, weights
+
+# 최적화 없이 얻을 수 있는 포트폴리오 (결과 캐시 → 안정형 예금 → 사전 계산표), 없으면 None
+def lookup_portfolio(user, profile):
+    portfolio = result_cache.get(profile["key"])
+    if portfolio is not None:
+        portfolio_source_total.inc(source="cache")
+        return portfolio
+
+    state = profile["dataset"]
+    source = None
+    if profile["investment_type"] == "안정형":
+        portfolio, source = select_deposit_portfolio(user, state), "deposit"
+    elif state.precomputed_table is not None:
+        portfolio, source = state.precomputed_table.lookup(
+            age_bracket(parse_user_age(user.age_group)), profile["calculated_A"], profile["target_risky_ratio"],
+        ), "precomputed"
+    if portfolio is None:
+        return None
+    portfolio_source_total.inc(source=source)
+    return _remember(profile["key"], portfolio)
+
+# 같은 정규화 입력이면 같은 portfolio_id (조회 시 TTL 갱신)
+def register_portfolio(key, portfolio):
+    portfolio_id = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+    portfolio_store.put(portfolio_id, portfolio)
+    return portfolio_id
+
+def _recommendation(profile, portfolio):
+    asset_names, weights = portfolio
+    return {
+        "portfolio_id": register_portfolio(profile["key"], portfolio),
+        "calculated_A": profile["calculated_A"],
+        "investor_score": profile["investor_score"],
+        "target_risky_ratio": profile["target_risky_ratio"],
+        "alpha": profile["alpha"],
+        "asset_names": asset_names,
+        "weights": weights,
+        "warnings": profile["warnings"],
+        "asset_table": profile["dataset"].asset_table,
+    }
+
+# 사용자와 무관한 최적화 입력: 시장 버전(연령 구간별 지문)당 1회 계산해 읽기 전용으로 공유
+def market_inputs(user, profile):
+    market_version = profile["key"][0]
+    market = market_cache.get(market_version)
+    if market is None:
+        state = profile["dataset"]
+        with stage_seconds.time(stage="er_sigma"):
+            ER, Sigma, asset_names, principal_asset_indices, non_principal_asset_indices = calculate_er_sigma(
+                None, None, profile["calculated_A"], user, universe=state.dataset.fund_universe,
+                deposit_index=state.dataset.deposit_index,
+                deposit_names=state.asset_table.deposit_names[profile["key"][1]])
+        for arr in (ER, Sigma):
+            if isinstance(arr, np.ndarray):
+                arr.flags.writeable = False
+        market = (ER, Sigma, tuple(asset_names), tuple(principal_asset_indices), tuple(non_principal_asset_indices))
+        market_cache.put(market_version, market)
+    return market
+
+# 포트폴리오(자산명, 비중) → 최적화 입력과 같은 자산 순서의 비중 벡터
+def aligned_weights(portfolio, asset_names):
+    position = {name: i for i, name in enumerate(asset_names)}
+    weights = np.zeros(len(asset_names))
+    for name, w in zip(*portfolio):
+        weights[position[name]] = w
+    return weights
+
+# 솔버 통계 → 지표 (합쳐진 동시 요청은 같은 통계 객체를 받으므로 한 번만 기록)
+def record_solve(stats):
+    if not stats or stats.get("recorded"):
+        return
+    stats["recorded"] = True
+    outcome = "success" if stats["success"] else "fallback"
+    solves_total.inc(solver=stats["solver"], outcome=outcome)
+    solver_iterations.observe(stats["nit"], solver=stats["solver"])
+    stage_seconds.observe(stats["seconds"], stage="solve" if stats["success"] else "fallback")
+    portfolio_source_total.inc(source="solve")
+
+# 최적화에 남길 자산 위치 (후보 축소를 끄면 None = 전체)
+def screened_assets(profile, principal_asset_indices):
+    if not SCREENING.enabled:
+        return None
+    screen = screen_funds(profile["dataset"].dataset.fund_universe, profile["calculated_A"], SCREENING,
+                          offset=len(principal_asset_indices))
+    screening_stats["solves"] += 1
+    screening_stats["funds_total"] += screen.total_funds
+    screening_stats["funds_kept"] += screen.kept_funds
+    for stage, count in screen.pruned.items():
+        screening_stats["pruned"][stage] = screening_stats["pruned"].get(stage, 0) + count
+    return screen.active
+
+# 최적화를 프로세스 풀로 넘김 (동일 입력의 동시 요청은 하나의 작업으로 합침)
+# x0/active: 호출 측이 이미 아는 초기값/후보 자산 (없으면 웜스타트 저장소/후보 축소로 계산)
+async def solve_portfolio_async(profile, market, x0=None, active=None):
+    A, target_risky_ratio, alpha = profile["calculated_A"], profile["target_risky_ratio"], profile["alpha"]
+    ER, Sigma, asset_names, principal_asset_indices, non_principal_asset_indices = market
+    fingerprint = asset_fingerprint(ER, non_principal_asset_indices)
+    adjusted_target_risky_ratio = min(target_risky_ratio, IRP_MAX)
+    if x0 is None:
+        x0 = warm_start_store.lookup(fingerprint, A, alpha, adjusted_target_risky_ratio,
+                                     exact=SOLVER_BACKEND not in NEIGHBOR_WARM_START_SOLVERS)
+    if active is None:
+        active = screened_assets(profile, principal_asset_indices)
+
+    with stage_seconds.time(stage="solver_pool"):  # 대기열 + 프로세스 간 전송 + 최적화
+        weights, stats = await solver_pool.run(
+            profile["key"], solve_in_worker,
+            ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio, alpha,
+            SOLVER_BACKEND, x0, active)
+    record_solve(stats)
+    if stats["success"]:
+        warm_start_store.store(fingerprint, A, alpha, adjusted_target_risky_ratio, weights)
+    return _remember(profile["key"], (asset_names, weights))
+
+# 비동기 버전 (최적화는 프로세스 풀에서)
+async def build_recommendation_async(user):
+    profile = score_survey(user)
+    portfolio = lookup_portfolio(user, profile)
+    if portfolio is None:
+        portfolio = await solve_portfolio_async(profile, market_inputs(user, profile))
+    return _recommendation(profile, portfolio)
+
+# 세션 재제출 (X-Session-Token): 직전 상태(점수 내역, 정규화 키, 포트폴리오, 후보 자산)에서 바뀐 부분만 다시 계산
+#   unchanged: 정규화 입력이 그대로 → 직전 포트폴리오 즉시 반환 / cache: 캐시·사전 계산표·안정형
+#   warm: 직전 해에서 최적화 시작 (QP만) / cold: 첫 제출, 연령 구간·데이터 변경, 또는 SLSQP (초기값이 결과를 바꿀 수 있음)
+async def build_session_recommendation(user, token):
+    state = dataset_manager.current
+    previous = session_store.get(token)
+    if previous is not None and previous["generation"] != state.generation:
+        previous = None
+    profile = score_survey(user, state, previous["survey_score"] if previous else None)
+    key = profile["key"]
+    active = None
+    if previous is not None and key == previous["key"]:
+        outcome, portfolio, active = "unchanged", previous["portfolio"], previous["active"]
+    else:
+        outcome, portfolio = "cache", lookup_portfolio(user, profile)
+    if portfolio is None:
+        market = market_inputs(user, profile)
+        x0 = None
+        if previous is not None and key[:2] == previous["key"][:2]:  # 같은 시장 버전·연령 구간 → 같은 자산 순서
+            if SOLVER_BACKEND in NEIGHBOR_WARM_START_SOLVERS:  # 직전 해가 결과를 바꾸지 않는 방식만
+                x0 = aligned_weights(previous["portfolio"], market[2])
+            if key[2] == previous["key"][2]:  # A가 같으면 후보 축소 결과도 같음
+                active = previous["active"]
+        if active is None:
+            active = screened_assets(profile, market[3])
+        outcome = "warm" if x0 is not None else "cold"
+        portfolio = await solve_portfolio_async(profile, market, x0=x0, active=active)
+    session_store.put(token, {"generation": state.generation, "survey_score": profile["survey_score"], "key": key,
+                              "portfolio": portfolio, "active": active})
+    session_requests_total.inc(outcome=outcome)
+    rec = _recommendation(profile, portfolio)
+    rec["session"] = {"outcome": outcome, "changed_items": list(profile["changed_items"])}
+    return rec
+
+# 일괄 추천: 정규화 키가 같은 입력끼리 묶어 키당 한 번만 최적화하고, 끝나는 순서대로 (입력 순번, 추천 또는 예외) 반환
+async def iter_batch_recommendations(users, max_concurrency=None):
+    state = dataset_manager.current  # 배치 전체가 같은 데이터셋 사용
+    groups = {}  # 키 → (대표 입력, [(순번, 프로필)])
+    for index, user in enumerate(users):
+        try:
+            profile = score_survey(user, state)
+        except Exception as e:
+            yield index, e
+            continue
+        groups.setdefault(profile["key"], (user, []))[1].append((index, profile))
+
+    # 대화형 요청이 거절되지 않도록 풀 대기열의 절반까지만 사용
+    semaphore = asyncio.Semaphore(max_concurrency or max(solver_pool.max_pending // 2, 1))
+    markets = {}  # 최적화 입력 지문 → ER/Sigma
+
+    async def solve_group(key, profile, user):
+        async with semaphore:
+            try:
+                if key[0] not in markets:
+                    markets[key[0]] = market_inputs(user, profile)
+                return key, await solve_portfolio_async(profile, markets[key[0]])
+            except Exception as e:
+                return key, e
+
+    tasks = []
+    for key, (user, members) in groups.items():
+        try:
+            portfolio = lookup_portfolio(user, members[0][1])
+        except Exception as e:
+            portfolio = e
+        if portfolio is None:
+            tasks.append(asyncio.ensure_future(solve_group(key, members[0][1], user)))
+            continue
+        for index, profile in members:
+            yield index, portfolio if isinstance(portfolio, Exception) else _recommendation(profile, portfolio)
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            key, portfolio = await next_done
+            for index, profile in groups[key][1]:
+                yield index, portfolio if isinstance(portfolio, Exception) else _recommendation(profile, portfolio)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+# 일괄 추천 (Python 진입점): 입력 순서대로 추천 목록 반환, 실패한 항목은 예외 객체
+def recommend_batch(users, max_concurrency=None):
+    async def collect():
+        results = [None] * len(users)
+        async for index, rec in iter_batch_recommendations(users, max_concurrency):
+            results[index] = rec
+        return results
+    return asyncio.run(collect())
 
 @app.get("/")
 def read_root():
@@ -49,150 +514,315 @@ class UserInput(BaseModel):
     age_group: str = Field(..., example="30대(35~39세)")
     answers: Dict[str, str] = Field(...)
 
-from fastapi import Request
-from fastapi.responses import JSONResponse
-
-@app.options("/recommend")
-async def options_recommend(request: Request):
-    response = JSONResponse(content={"message": "ok"})
-    response.headers["Access-Control-Allow-Origin"] = "https://irp-portfolio.vercel.app"
-    response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "*"
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    return response
+# 차트에 표시할 자산 (비중 1% 초과)
+def _chart_slices(asset_names, weights, min_weight=0.01):
+    weights = np.asarray(weights)
+    selected = np.flatnonzero(weights > min_weight)
+    names, values = [asset_names[i] for i in selected.tolist()], weights[selected].tolist()
+    if not names:
+        raise HTTPException(status_code=400, detail="포트폴리오 플롯을 생성할 자산이 없습니다.")
+    return names, values
+
+def render_chart(names, values, chart_format):
+    with stage_seconds.time(stage="render"):
+        return chart_renderer.render(names, values, chart_format)
+
+async def _chart_response(asset_names, weights, chart_format):
+    names, values = _chart_slices(asset_names, weights)
+    if chart_format == "json":
+        return JSONResponse(content=chart_renderer.chart_spec(names, values))
+    content, media_type = await run_in_threadpool(render_chart, names, values, chart_format)
+    return Response(content=content, media_type=media_type)
+
+# /recommend 응답에 함께 싣는 차트 (이미지는 base64)
+async def _inline_chart(asset_names, weights, chart_format):
+    names, values = _chart_slices(asset_names, weights)
+    if chart_format == "json":
+        return {"format": "json", "spec": chart_renderer.chart_spec(names, values)}
+    content, media_type = await run_in_threadpool(render_chart, names, values, chart_format)
+    return {"format": chart_format, "media_type": media_type, "data": base64.b64encode(content).decode('ascii')}
+
+# 추천 → 응답 본문 (비중 0.1% 초과 자산만)
+# compact: 자산명 대신 자산 ID 배열 + 비중 배열 (ID → 자산명은 GET /assets, assets_version = 그 ETag)
+def recommendation_payload(rec, compact=False):
+    weights = np.asarray(rec["weights"])
+    nonzero = np.flatnonzero(weights > 0.001)
+    values = [round(w, 4) for w in weights[nonzero].tolist()]
+    payload = {
+        "portfolio_id": rec["portfolio_id"],
+        "calculated_A": rec["calculated_A"],
+        "investor_score": rec["investor_score"],
+        "target_risky_ratio": rec["target_risky_ratio"],
+        "alpha": rec["alpha"],
+    }
+    if compact:
+        payload["asset_ids"] = rec["asset_table"].ids(rec["asset_names"])[nonzero].tolist()
+        payload["weights"] = values
+        payload["assets_version"] = rec["asset_table"].version
+    else:
+        names = rec["asset_names"]
+        payload["portfolio"] = [{"asset": names[i], "weight": w} for i, w in zip(nonzero.tolist(), values)]
+    payload["warnings"] = rec["warnings"]
+    if "session" in rec:
+        payload["session"] = rec["session"]
+    return payload
 
 @app.post("/recommend")
-def recommend(user: UserInput):
+async def recommend(user: UserInput,
+                    chart_format: Optional[str] = Query(None, alias="chart", pattern="^(png|svg|json)$"),
+                    compact: bool = False,
+                    x_session_token: Optional[str] = Header(None, max_length=128)):
     try:
-        logger.info("[INPUT] %s", user.answers)
-        A, warnings, investor_score = calculate_A_from_survey(user, risk_weight_df, investor_df)
-        logger.info("[CALCULATED A]: %.2f, [INVESTOR SCORE]: %.2f", A, investor_score)
-
-        investment_type = user.answers.get("투자성향설문")
-        target_risky_mapping = {
-            "안정형": 0.0,
-            "안정추구형": 0.2,
-            "중립투자형": 0.4,
-            "적극투자형": 0.6,
-            "공격투자형": 0.7
-        }
-        target_risky_ratio = target_risky_mapping.get(investment_type, 0.7)
-
-        results = []
-
-        if investment_type == "안정형":
-            logger.info("안정형 투자자 - 예금 상품 선택 중")
-            age_match = re.search(r'\d+', user.age_group)
-            user_age = int(age_match.group()) if age_match else 30
-
-            selected_deposits = filter_best_principal_products_by_age_cumsum(principal_df, user_age, cumsum_threshold=0.9)
-            total_rate = selected_deposits['연 금리(%)'].sum()
-
-            for _, row in selected_deposits.iterrows():
-                weight = row['연 금리(%)'] / total_rate if total_rate > 0 else 1 / len(selected_deposits)
-                results.append({"asset": f"예금_{row['상품명']}", "weight": round(weight, 4)})
-
-            response_data = {
-                "calculated_A": A,
-                "investor_score": investor_score,
-                "target_risky_ratio": target_risky_ratio,
-                "alpha": get_alpha_by_A(A),
-                "portfolio": results,
-                "warnings": warnings
-            }
-
-            response = JSONResponse(content=response_data)
-            response.headers["Access-Control-Allow-Origin"] = "https://irp-portfolio.vercel.app"
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            return response
-
-        alpha = get_alpha_by_A(A)
-        ER, Sigma, asset_names, principal_asset_indices, non_principal_asset_indices = calculate_er_sigma(
-            principal_df, non_principal_df, A, user)
-        portfolio_weights, _ = optimize_portfolio(
-            ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio, alpha)
-
-        results = [
-            {"asset": name, "weight": round(w, 4)}
-            for name, w in zip(asset_names, portfolio_weights) if w > 0.001
-        ]
-
-        response_data = {
-            "calculated_A": A,
-            "investor_score": investor_score,
-            "target_risky_ratio": target_risky_ratio,
-            "alpha": alpha,
-            "portfolio": results,
-            "warnings": warnings
-        }
-
-        response = JSONResponse(content=response_data)
-        response.headers["Access-Control-Allow-Origin"] = "https://irp-portfolio.vercel.app"
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        return response
-
+        logger.debug("[INPUT] %s", user.answers)
+        if x_session_token:
+            rec = await build_session_recommendation(user, x_session_token)
+        else:
+            rec = await build_recommendation_async(user)
+        logger.debug("[CALCULATED A]: %.2f, [INVESTOR SCORE]: %.2f", rec["calculated_A"], rec["investor_score"])
+
+        response_data = recommendation_payload(rec, compact)
+        if chart_format is not None:
+            response_data["chart"] = await _inline_chart(rec["asset_names"], rec["weights"], chart_format)
+        return FastJSONResponse(content=response_data)
+
+    except HTTPException:
+        raise
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/plot")
-def plot_pie(user: UserInput):
+BATCH_MAX_SIZE = int(os.environ.get('IRP_BATCH_MAX_SIZE', 10000))
+
+# 일괄 추천: 한 줄에 하나씩 NDJSON으로, 계산이 끝나는 순서대로 전송 ("index" = 입력 순번)
+@app.post("/recommend/batch")
+async def recommend_batch_endpoint(users: List[UserInput], compact: bool = False):
+    if len(users) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"한 번에 최대 {BATCH_MAX_SIZE}건까지 요청할 수 있습니다.")
+    logger.info("[BATCH] %d건 요청", len(users))
+
+    async def lines():
+        async for index, rec in iter_batch_recommendations(users):
+            if isinstance(rec, Exception):
+                line = {"index": index, "error": str(rec)}
+            else:
+                line = {"index": index, **recommendation_payload(rec, compact)}
+            yield json_bytes(line) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/startup")
+def startup():
+    return startup_report()
+
+# 데이터 즉시 리로드 (X-Admin-Token 헤더 = IRP_ADMIN_TOKEN, 미설정 시 비활성)
+ADMIN_TOKEN = os.environ.get('IRP_ADMIN_TOKEN')
+
+@app.post("/admin/reload")
+async def admin_reload(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="관리자 토큰이 없거나 올바르지 않습니다.")
+    swapped, state = await run_in_threadpool(dataset_manager.reload, force)
+    if dataset_manager.last_error:
+        raise HTTPException(status_code=500, detail=f"리로드 실패, 세대 {state.generation} 유지: {dataset_manager.last_error}")
+    return {"swapped": swapped, **dataset_manager.stats()}
+
+# 투자선: 설문 응답자의 연령 구간에서 (A, 목표 비중) 격자 전체의 추천 변화
+# (기본 격자 = A 1~10과 응답자의 A × 투자성향별 목표 비중, 응답자 자신의 점은 "current")
+FRONTIER_MAX_POINTS = int(os.environ.get('IRP_FRONTIER_MAX_POINTS', 200))
+FRONTIER_A_VALUES = tuple(float(A) for A in range(1, 11))
+FRONTIER_TARGETS = tuple(sorted({ratio for ratio in TARGET_RISKY_MAPPING.values() if ratio > 0}))
+
+class FrontierInput(BaseModel):
+    age_group: str = Field(..., example="30대(35~39세)")
+    answers: Dict[str, str] = Field(default_factory=dict)
+    A_values: Optional[List[float]] = None
+    target_risky_ratios: Optional[List[float]] = None
+
+# 후보 축소를 켜면 A별 남길 자산 위치 (워커로 넘기도록 dict.get)
+def frontier_screens(profile, A_values, num_principal):
+    if not SCREENING.enabled:
+        return None
+    universe = profile["dataset"].dataset.fund_universe
+    return {A: screen_funds(universe, A, SCREENING, offset=num_principal).active for A in A_values}.get
+
+# 격자 점별 곡선 + 자산별 비중 경로 (한 점이라도 0.1%를 넘는 자산만, 최대 비중 순)
+def frontier_payload(result, asset_names, profile, age_group):
+    current = (round(profile["calculated_A"], 2), min(profile["target_risky_ratio"], IRP_MAX))
+    points = [{**point, "current": (point["A"], point["target_risky_ratio"]) == current} for point in result.points]
+    peaks = result.weights.max(axis=0)
+    paths = [
+        {"asset": asset_names[i], "weights": [round(float(w), 4) for w in result.weights[:, i]]}
+        for i in np.argsort(-peaks, kind='stable') if peaks[i] > 0.001
+    ]
+    return {
+        "age_group": age_group,
+        "calculated_A": profile["calculated_A"],
+        "target_risky_ratio": profile["target_risky_ratio"],
+        "A_values": list(result.A_values),
+        "target_risky_ratios": list(result.target_risky_ratios),
+        "frontier": points,
+        "weight_paths": paths,
+        "solve_seconds": round(result.seconds, 4),
+        "iterations": result.iterations,
+        "warnings": profile["warnings"],
+    }
+
+@app.post("/frontier")
+async def frontier(request: FrontierInput):
     try:
-        A, warnings, investor_score = calculate_A_from_survey(user, risk_weight_df, investor_df)
-        investment_type = user.answers.get("투자성향설문")
-        target_risky_mapping = {
-            "안정형": 0.0,
-            "안정추구형": 0.2,
-            "중립투자형": 0.4,
-            "적극투자형": 0.6,
-            "공격투자형": 0.7
-        }
-        target_risky_ratio = target_risky_mapping.get(investment_type, 0.7)
-
-        names, values = [], []
-
-        if investment_type == "안정형":
-            logger.info("안정형 투자자 - 예금 플롯 생성 중")
-            age_match = re.search(r'\d+', user.age_group)
-            user_age = int(age_match.group()) if age_match else 30
-            selected_deposits = filter_best_principal_products_by_age_cumsum(principal_df, user_age, cumsum_threshold=0.9)
-            total_rate = selected_deposits['연 금리(%)'].sum()
-            for _, row in selected_deposits.iterrows():
-                names.append(f"예금_{row['상품명']}")
-                weight = row['연 금리(%)'] / total_rate if total_rate > 0 else 1 / len(selected_deposits)
-                values.append(weight)
-        else:
-            alpha = get_alpha_by_A(A)
-            ER, Sigma, asset_names_all, principal_asset_indices, non_principal_asset_indices = calculate_er_sigma(principal_df, non_principal_df, A, user)
-            portfolio_weights, _ = optimize_portfolio(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio, alpha)
-            for name, w in zip(asset_names_all, portfolio_weights):
-                if w > 0.01:
-                    names.append(name)
-                    values.append(w)
+        profile = score_survey(request)
+        A_values = sorted({round(A, 2) for A in (request.A_values or FRONTIER_A_VALUES + (profile["calculated_A"],))})
+        targets = sorted({round(t, 2) for t in (request.target_risky_ratios or FRONTIER_TARGETS)})
+        if any(A <= 0 for A in A_values) or any(not 0 <= t <= IRP_MAX for t in targets):
+            raise HTTPException(status_code=400, detail=f"A는 양수, 목표 비중은 0~{IRP_MAX} 사이여야 합니다.")
+        if len(A_values) * len(targets) > FRONTIER_MAX_POINTS:
+            raise HTTPException(status_code=413, detail=f"격자는 최대 {FRONTIER_MAX_POINTS}개 점까지 계산할 수 있습니다.")
+        ER, Sigma, asset_names, principal_asset_indices, non_principal_asset_indices = market_inputs(request, profile)
+        key = ("frontier", profile["key"][0], profile["key"][1], tuple(A_values), tuple(targets))
+        result = await solver_pool.run(
+            key, frontier_in_worker, ER, Sigma, A_values, targets, principal_asset_indices,
+            non_principal_asset_indices, SOLVER_BACKEND,
+            frontier_screens(profile, A_values, len(principal_asset_indices)))
+        stage_seconds.observe(result.seconds, stage="frontier")
+        for point in result.points:
+            solves_total.inc(solver=SOLVER_BACKEND, outcome="success" if point["success"] else "fallback")
+        return frontier_payload(result, asset_names, profile, request.age_group)
+
+    except HTTPException:
+        raise
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error("[ERROR] /frontier 에러: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if not names:
-            raise HTTPException(status_code=400, detail="포트폴리오 플롯을 생성할 자산이 없습니다.")
+# 적립금 전망: 추천 포트폴리오를 운용 기간(기본 55세까지) 동안 몬테카를로 또는 과거 지수 재현
+PROJECTION_PATHS = int(os.environ.get('IRP_PROJECTION_PATHS', 20000))
+PROJECTION_MAX_PATHS = int(os.environ.get('IRP_PROJECTION_MAX_PATHS', 100000))
+INDEX_SERIES_PATH = os.environ.get('IRP_INDEX_SERIES', os.path.join(DATA_DIR, 'index_series.csv'))
+_index_series = {}  # 파일 수정 시각 → 지수 시계열 (파일이 바뀌면 다시 읽음)
+
+class ProjectionInput(UserInput):
+    mode: str = Field("monte_carlo", pattern="^(monte_carlo|historical)$")
+    years: Optional[int] = Field(None, ge=1, le=60)
+    initial_balance: float = Field(10_000_000, ge=0)
+    annual_contribution: float = Field(0, ge=0)
+    goal: Optional[float] = Field(None, gt=0)
+    paths: Optional[int] = Field(None, ge=100, le=PROJECTION_MAX_PATHS)
+    seed: int = 0
+
+def index_series():
+    if not os.path.exists(INDEX_SERIES_PATH):
+        return None
+    mtime = os.path.getmtime(INDEX_SERIES_PATH)
+    if mtime not in _index_series:
+        _index_series.clear()
+        _index_series[mtime] = load_index_series(INDEX_SERIES_PATH)
+    return _index_series[mtime]
+
+def run_projection(request, profile, market, weights):
+    ER, Sigma, _, principal_asset_indices, _ = market
+    years = request.years or default_horizon(parse_user_age(request.age_group))
+    with stage_seconds.time(stage="projection"):
+        if request.mode == "historical":
+            return replay_portfolio(weights, ER, len(principal_asset_indices),
+                                    profile["dataset"].dataset.fund_universe.index_links, index_series(), years,
+                                    request.initial_balance, request.annual_contribution)
+        return project_portfolio(weights, ER, Sigma, years, request.paths or PROJECTION_PATHS,
+                                 request.initial_balance, request.annual_contribution, request.seed)
+
+@app.post("/projection")
+async def projection(request: ProjectionInput):
+    try:
+        profile = score_survey(request)
+        if request.mode == "historical" and (
+                index_series() is None or profile["dataset"].dataset.fund_universe.index_links is None):
+            raise HTTPException(status_code=404, detail="과거 지수 시계열(IRP_INDEX_SERIES) 또는 펀드별 참고 지수가 없습니다.")
+        market = market_inputs(request, profile)
+        portfolio = lookup_portfolio(request, profile)
+        if portfolio is None:
+            portfolio = await solve_portfolio_async(profile, market)
+        rec = _recommendation(profile, portfolio)
+        result = await run_in_threadpool(run_projection, request, profile, market, aligned_weights(portfolio, market[2]))
+        return {
+            "portfolio_id": rec["portfolio_id"],
+            "calculated_A": rec["calculated_A"],
+            "target_risky_ratio": rec["target_risky_ratio"],
+            "projection": result.summary(goal=request.goal),
+            "warnings": rec["warnings"],
+        }
 
-        fig, ax = plt.subplots(figsize=(6, 6))
+    except HTTPException:
+        raise
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error("[ERROR] /projection 에러: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
 
-        def shorten_label(name):
-            return name[:18] + "…" if len(name) > 20 else name
+# 간결 응답 형식의 자산 ID → 자산명 (데이터셋이 바뀌면 ETag도 바뀜, If-None-Match가 같으면 304)
+ASSETS_MAX_AGE = int(os.environ.get('IRP_ASSETS_MAX_AGE', 300))
+_assets_body = {}  # 자산명 표 버전 → 응답 본문
+
+@app.get("/assets")
+def assets(if_none_match: Optional[str] = Header(None)):
+    table = dataset_manager.current.asset_table
+    etag = f'"{table.version}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={ASSETS_MAX_AGE}"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    body = _assets_body.get(table.version)
+    if body is None:
+        _assets_body.clear()
+        body = _assets_body[table.version] = json_bytes({"version": table.version, "assets": list(table.names)})
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Prometheus 수집용 지표
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# 표본 추출된 느린 요청의 프로파일 (IRP_PROFILE_SAMPLE_RATE > 0 일 때)
+@app.get("/metrics/profiles")
+def slow_request_profiles():
+    return {"profiler": slow_request_profiler.stats(), "profiles": list(slow_request_profiler.entries)}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"dataset": dataset_manager.stats(), "result_cache": result_cache.stats(), "solver_pool": solver_pool.stats(),
+            "chart_cache": chart_renderer.cache.stats(), "portfolio_store": portfolio_store.stats(),
+            "sessions": session_store.stats(),
+            "screening": {**SCREENING.as_dict(), **screening_stats, "pruned": dict(screening_stats["pruned"])}}
 
-        display_names = [shorten_label(name) for name in names]
-        total = sum(values)
-        values = [v / total for v in values] if total > 0 else values
+@app.post("/plot")
+async def plot_pie(user: UserInput, chart_format: str = Query("png", alias="format", pattern="^(png|svg|json)$")):
+    try:
+        rec = await build_recommendation_async(user)
+        return await _chart_response(rec["asset_names"], rec["weights"], chart_format)
 
-        ax.pie(values, labels=display_names, autopct='%1.1f%%', startangle=90)
-        ax.axis('equal')
-        plt.title("추천 포트폴리오 자산 비중")
+    except HTTPException:
+        raise
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error("[ERROR] /plot 에러: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
 
-        buf = BytesIO()
-        plt.savefig(buf, format="png", bbox_inches="tight")
-        buf.seek(0)
-        plt.close()
-        return StreamingResponse(buf, media_type="image/png")
+# /recommend 가 돌려준 portfolio_id 로 이미 계산된 포트폴리오의 차트 조회 (재최적화 없음)
+@app.get("/plot/{portfolio_id}")
+async def plot_portfolio(portfolio_id: str,
+                         chart_format: str = Query("png", alias="format", pattern="^(png|svg|json)$")):
+    portfolio = portfolio_store.get(portfolio_id)
+    if portfolio is None:
+        raise HTTPException(status_code=404, detail="포트폴리오가 없거나 만료되었습니다. /recommend 를 다시 호출하세요.")
+    try:
+        return await _chart_response(*portfolio, chart_format)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error("[ERROR] /plot 에러: %s", str(e))
+        logger.error("[ERROR] /plot/%s 에러: %s", portfolio_id, str(e))
         raise HTTPException(status_code=500, detail=str(e))
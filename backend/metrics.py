@@ -0,0 +1,210 @@
+# metrics.py
+# 경량 지표 수집 → Prometheus 텍스트 형식 (/metrics)
+#   - Counter / Histogram: 요청 경로에서 갱신 (잠금 1회)
+#   - 게이지 콜백: 캐시 적중률/대기열 길이처럼 이미 다른 객체가 세고 있는 값은 조회 시점에 읽음
+#   - SlowRequestProfiler: 일부 요청만 cProfile로 측정해 느린 요청의 프로파일만 보관
+import bisect
+import cProfile
+import io
+import math
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 초 단위 기본 구간 (1ms ~ 10s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 레이블은 {self.labelnames} 이어야 합니다: {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # 레이블 → [구간별 개수..., 합계, 개수]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)  # value <= 구간 상한인 첫 구간
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % _number(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [le])} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [le])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+# 조회 시점에 collect()가 [(레이블 값 튜플, 값)]을 돌려줌
+class CallbackGauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames, collect):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+
+    def render(self):
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+                                for key, value in self.collect()]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"이미 등록된 지표입니다: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, labelnames, collect):
+        return self._register(CallbackGauge(name, help_text, labelnames, collect))
+
+    # 수집 중 오류가 난 지표는 건너뜀 (나머지 지표는 계속 노출)
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} 수집 실패: {type(e).__name__}")
+        return "\n".join(lines) + "\n"
+
+
+# 요청 일부(sample_rate)만 프로파일링하고, threshold_ms 이상 걸린 요청의 상위 함수 목록만 보관
+# 이벤트 루프 스레드만 측정 (그 사이 같은 루프에서 돈 다른 요청도 포함, 프로세스 풀 작업은 제외)
+class SlowRequestProfiler:
+    def __init__(self, sample_rate=0.0, threshold_ms=500.0, keep=20, top=25):
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.top = top
+        self.entries = deque(maxlen=keep)
+        self._busy = threading.Lock()  # 프로파일러는 한 번에 하나만
+        self.sampled = 0
+        self.captured = 0
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def start(self):
+        if not self.enabled or random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop(self, profiler, label, elapsed_ms):
+        profiler.disable()
+        self._busy.release()
+        self.sampled += 1
+        if elapsed_ms < self.threshold_ms:
+            return
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(self.top)
+        self.captured += 1
+        self.entries.append({
+            "label": label,
+            "elapsed_ms": round(elapsed_ms, 1),
+            "captured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "profile": out.getvalue(),
+        })
+
+    def stats(self):
+        return {"sample_rate": self.sample_rate, "threshold_ms": self.threshold_ms, "sampled": self.sampled,
+                "captured": self.captured, "kept": len(self.entries)}
@@ -1,31 +1,26 @@
 # optimizer.py
+import logging
+import time
+from dataclasses import dataclass
+
 import numpy as np
-import pandas as pd
-from scipy.optimize import minimize
-import yfinance as yf
 
-# 효용 함수
+from correlation import build_correlation_matrix, build_rule_table, classify_fund, encode_categories
+from factor import DEPOSIT_VARIANCE, FactorCovariance, index_links_from_attributes
+from funds import fund_table_from_frame
+from solvers import get_solver, largest_eigenvalue
+from utils import build_deposit_index, parse_user_age
+from warmstart import NEIGHBOR_WARM_START_SOLVERS, asset_fingerprint, target_ratio_split
+
+logger = logging.getLogger(__name__)
+
+# 효용 함수 (그래디언트: solvers.utility_gradient)
 def utility_function(weights, ER, Sigma, A, alpha=0.5):
     portfolio_return = np.dot(weights, ER)
-    portfolio_variance = np.dot(weights.T, np.dot(Sigma, weights))
+    portfolio_variance = np.dot(weights, Sigma @ weights)
     diversification_penalty = 1 - np.var(weights)
     return - (portfolio_return - alpha * A * portfolio_variance) + diversification_penalty * 0.5
 
-# 자산 비중
-def get_bounds(num_assets):
-    return tuple((0, 1.0) for _ in range(num_assets))
-
-# 제약 조건 설정
-def get_constraints(principal_asset_indices, non_principal_asset_indices, target_risky_ratio=0.7):
-    constraints = [
-        {'type': 'eq', 'fun': lambda x: np.sum(x) - 1.0},  # 자산 비중 합이 1이어야 함
-    ]
-    constraints.append(
-        {'type': 'eq', 'fun': lambda x: np.sum([x[i] for i in non_principal_asset_indices]) - target_risky_ratio}
-    )
-
-    return constraints
-
 # A 값 기반 알파
 def get_alpha_by_A(A):
     if A >= 9.0:
@@ -41,224 +36,253 @@ def get_alpha_by_A(A):
     else:
         return 0.1
     
+IRP_MAX = 0.7 # IRP 규정 상한 (비보장형 비중)
+
+# 일부 자산(active, 오름차순 위치)만 남긴 부분 문제 (ER, Sigma, 보장형/비보장형 위치)
+def restrict_assets(ER, Sigma, principal_asset_indices, non_principal_asset_indices, active):
+    return (
+        ER[active],
+        Sigma.take(active) if isinstance(Sigma, FactorCovariance) else Sigma[np.ix_(active, active)],
+        np.searchsorted(active, np.intersect1d(principal_asset_indices, active)),
+        np.searchsorted(active, np.intersect1d(non_principal_asset_indices, active)),
+    )
+
 # 포트폴리오 최적화
-def optimize_portfolio(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio=0.7, alpha=None):
+def optimize_portfolio(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio=0.7, alpha=None,
+                       solver='slsqp', x0=None, warm_start=None, active=None, stats=None, solver_options=None):
     num_assets = len(ER)
     if alpha is None:
         alpha = get_alpha_by_A(A)
 
-    IRP_MAX = 0.7 # IRP 규정 상한
-
     # target_risky_ratio가 IRP_MAX를 초과하지 않도록 보정
     adjusted_target_risky_ratio = min(target_risky_ratio, IRP_MAX)
     if target_risky_ratio > IRP_MAX:
-        print(f"[WARN] 요청된 비보장형 상품 비중 {target_risky_ratio:.2f}가 IRP 허용 최대 {IRP_MAX:.2f}를 초과 → {IRP_MAX:.2f}로 조정")
-    
-    print(f"[DEBUG] A: {A:.2f}, alpha: {alpha:.2f}, 목표 비보장형 비중: {adjusted_target_risky_ratio:.2f}")
-    print(f"[DEBUG] 보장형 자산 인덱스: {principal_asset_indices}")
-    print(f"[DEBUG] 비보장형 자산 인덱스: {non_principal_asset_indices}")
-
-    # 초기 가중치
-    initial_weights = np.random.rand(num_assets)
-    initial_weights /= np.sum(initial_weights)
-
-    result = minimize(
-        fun=utility_function,
-        x0=initial_weights,
-        args=(ER, Sigma, A, alpha),
-        method='SLSQP',
-        bounds=get_bounds(num_assets),
-        constraints=get_constraints(principal_asset_indices, non_principal_asset_indices, adjusted_target_risky_ratio), # 변경된 제약 함수 호출
-        options={'disp': False}
-    )
+        logger.warning("요청된 비보장형 상품 비중 %.2f가 IRP 허용 최대 %.2f를 초과 → %.2f로 조정",
+                       target_risky_ratio, IRP_MAX, IRP_MAX)
+    logger.debug("A: %.2f, alpha: %.2f, 목표 비보장형 비중: %.2f, 보장형 %d개 / 비보장형 %d개",
+                 A, alpha, adjusted_target_risky_ratio, len(principal_asset_indices), len(non_principal_asset_indices))
+
+    # 초기 가중치: 명시적 x0 → 웜스타트 저장소의 가장 가까운 해 → 목표 비중 분할 (결정적)
+    fallback_weights = target_ratio_split(
+        num_assets, principal_asset_indices, non_principal_asset_indices, adjusted_target_risky_ratio)
+    fingerprint = asset_fingerprint(ER, non_principal_asset_indices) if warm_start is not None else None
+    initial_weights = x0
+    if initial_weights is None and warm_start is not None:
+        initial_weights = warm_start.lookup(fingerprint, A, alpha, adjusted_target_risky_ratio,
+                                            exact=solver not in NEIGHBOR_WARM_START_SOLVERS)
+    if initial_weights is None:
+        initial_weights = fallback_weights
+
+    solve = get_solver(solver)
+    solver_options = solver_options or {}
+    started = time.perf_counter()
+    if active is None:
+        result = solve(
+            utility_function, ER, Sigma, A, alpha,
+            principal_asset_indices, non_principal_asset_indices, adjusted_target_risky_ratio,
+            x0=initial_weights, **solver_options,
+        )
+    else:
+        # 후보 축소(screening.py): 남은 자산만으로 풀고 빠진 자산은 비중 0으로 되돌림
+        active = np.asarray(active, dtype=np.intp)
+        sub_ER, sub_Sigma, sub_principal, sub_non_principal = restrict_assets(
+            ER, Sigma, principal_asset_indices, non_principal_asset_indices, active)
+        result = solve(
+            utility_function, sub_ER, sub_Sigma, A, alpha, sub_principal, sub_non_principal,
+            adjusted_target_risky_ratio,
+            x0=np.asarray(initial_weights, dtype=float)[active], **solver_options,
+        )
+        full_weights = np.zeros(num_assets)
+        full_weights[active] = result.x
+        result.x = full_weights
+
+    # 호출한 쪽(프로세스 풀 포함)이 지표로 남길 수 있도록 솔버 통계를 채움
+    if stats is not None:
+        stats.update(solver=solver, seconds=time.perf_counter() - started, nit=int(getattr(result, 'nit', 0) or 0),
+                     success=bool(result.success))
 
     if result.success:
+        if warm_start is not None:
+            warm_start.store(fingerprint, A, alpha, adjusted_target_risky_ratio, result.x)
         return result.x, result
     else:
-        print("[FALLBACK] 최적화 실패 → 목표 비중에 따른 강제 분산")
-        weights = np.zeros(num_assets)
-        
-        # 비보장형 자산 비중 할당
-        if non_principal_asset_indices:
-            weight_per_non_principal_asset = adjusted_target_risky_ratio / len(non_principal_asset_indices)
-            for i in non_principal_asset_indices:
-                weights[i] = weight_per_non_principal_asset
-        
-        # 보장형 자산 비중 할당 (1 - 비보장형 총 비중)
-        if principal_asset_indices:
-            weight_per_principal_asset = (1.0 - adjusted_target_risky_ratio) / len(principal_asset_indices)
-            for i in principal_asset_indices:
-                weights[i] = weight_per_principal_asset
-        
-        # 합계가 1이 되지 않을 수 있으므로 마지막에 정규화
-        if np.sum(weights) > 0:
-            weights /= np.sum(weights)
-            
-        print(f"[FALLBACK] 생성된 가중치: {weights}")
-        return weights, None
+        logger.warning("[FALLBACK] 최적화 실패 (%s, %s) → 목표 비중에 따른 강제 분산", solver, getattr(result, 'message', ''))
+        return fallback_weights, None
+
+
+# 투자선 격자: 목표 비중 → A 순서, 행마다 방향을 바꿔(뱀 모양) 직전 점이 항상 이웃이 되도록
+def frontier_order(num_targets, num_A):
+    for i in range(num_targets):
+        for j in (range(num_A) if i % 2 == 0 else range(num_A - 1, -1, -1)):
+            yield i, j
+
+
+# 위험 수준별 추천 변화: (A, 목표 비중) 격자 전체를 한 번에 풂
+@dataclass(frozen=True)
+class FrontierResult:
+    A_values: tuple
+    target_risky_ratios: tuple
+    points: tuple           # 격자 순서(목표 비중 → A)의 점별 dict
+    weights: np.ndarray     # 점 수 × 자산 수 (points와 같은 순서)
+    seconds: float
+    iterations: int
+
+
+# 각 점은 이웃 점의 해에서 출발하고 (QP만, 그 밖의 방식은 점마다 결정적 초기값), 부분 문제(후보 축소)와 Sigma 최대 고유값은 후보 집합마다 1회만 계산
+# active: None, 위치 배열, 또는 A → 위치 배열 함수 (screening.screen_funds)
+def optimize_frontier(ER, Sigma, A_values, target_risky_ratios, principal_asset_indices, non_principal_asset_indices,
+                      solver='qp', alpha=None, active=None):
+    A_values = tuple(sorted({round(float(A), 2) for A in A_values}))
+    target_risky_ratios = tuple(sorted({round(float(t), 2) for t in target_risky_ratios}))
+    num_assets = len(ER)
+    subproblems = {}  # 후보 집합 → (위치, ER, Sigma, 보장형, 비보장형, 솔버 옵션)
+
+    def subproblem(A):
+        positions = active(A) if callable(active) else active
+        positions = np.arange(num_assets) if positions is None else np.asarray(positions, dtype=np.intp)
+        key = positions.tobytes()
+        if key not in subproblems:
+            if len(positions) == num_assets:
+                sub = (ER, Sigma, principal_asset_indices, non_principal_asset_indices)
+            else:
+                sub = restrict_assets(ER, Sigma, principal_asset_indices, non_principal_asset_indices, positions)
+            options = {'eigenvalue': largest_eigenvalue(sub[1], len(positions))} if solver == 'qp' else {}
+            subproblems[key] = (positions, *sub, options)
+        return subproblems[key]
+
+    weights = np.zeros((len(target_risky_ratios) * len(A_values), num_assets))
+    points = [None] * len(weights)
+    x0 = None
+    iterations = 0
+    started = time.perf_counter()
+    for i, j in frontier_order(len(target_risky_ratios), len(A_values)):
+        A, target_risky_ratio = A_values[j], target_risky_ratios[i]
+        point_alpha = alpha if alpha is not None else get_alpha_by_A(A)
+        positions, sub_ER, sub_Sigma, sub_principal, sub_non_principal, options = subproblem(A)
+        stats = {}
+        sub_weights, result = optimize_portfolio(
+            sub_ER, sub_Sigma, A, sub_principal, sub_non_principal, target_risky_ratio, point_alpha,
+            solver=solver, x0=None if x0 is None else x0[positions], stats=stats, solver_options=options)
+        row = i * len(A_values) + j
+        weights[row, positions] = sub_weights
+        if result is not None and solver in NEIGHBOR_WARM_START_SOLVERS:
+            x0 = weights[row]
+        iterations += stats["nit"]
+
+        w = weights[row]
+        variance = float(w @ (Sigma @ w))
+        points[row] = {
+            "A": A,
+            "target_risky_ratio": min(target_risky_ratio, IRP_MAX),
+            "alpha": point_alpha,
+            "expected_return": float(w @ ER),
+            "volatility": float(np.sqrt(max(variance, 0.0))),
+            "utility": float(utility_function(w, ER, Sigma, A, point_alpha)),
+            "success": result is not None,
+            "iterations": stats["nit"],
+        }
+
+    return FrontierResult(A_values=A_values, target_risky_ratios=target_risky_ratios, points=tuple(points),
+                          weights=weights, seconds=time.perf_counter() - started, iterations=iterations)
+
+
+
+# 펀드 유니버스: 사용자와 무관한 펀드 기대수익률/표준편차/카테고리/공분산을 서버 시작 시 1회 계산
+@dataclass(frozen=True)
+class AssetUniverse:
+    names: tuple            # "펀드_{상품명}" 형식의 자산명
+    expected_returns: np.ndarray
+    std_devs: np.ndarray
+    categories: tuple
+    category_codes: np.ndarray
+    corr: np.ndarray        # 팩터 모델이면 None
+    cov: np.ndarray         # N×N 또는 factor.FactorCovariance
+    index_links: object = None  # factor.IndexLinks (펀드별 참고 지수, 팩터 모델/스냅샷용)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def _readonly(arr):
+    arr = np.ascontiguousarray(arr, dtype=float)
+    arr.flags.writeable = False
+    return arr
+
+
+# 펀드 표 → 유니버스 (기대수익률/변동성은 funds.py에서 지수 기반 값 우선으로 계산)
+def build_asset_universe(non_principal_df, rule_table=None, fund_stats='period', covariance_model=None):
+    return universe_from_fund_table(fund_table_from_frame(non_principal_df, fund_stats), rule_table, covariance_model)
+
+
+def universe_from_fund_table(fund_table, rule_table=None, covariance_model=None):
+    names = tuple(f"펀드_{name}" for name in fund_table.names)
+    categories = tuple(classify_fund(name) for name in fund_table.names)
+    return assemble_asset_universe(names, categories, fund_table.expected_returns, fund_table.std_devs, rule_table,
+                                   index_links_from_attributes(fund_table.attributes, len(fund_table)),
+                                   covariance_model)
+
+
+# 펀드별 값(자산명, 카테고리, 기대수익률, 표준편차) → 상관관계/공분산까지 갖춘 유니버스 (스냅샷 로드에도 사용)
+def assemble_asset_universe(names, categories, expected_returns, std_devs, rule_table=None, index_links=None,
+                            covariance_model=None):
+    std_devs = np.asarray(std_devs, dtype=float)
 
+    # 펀드 그룹별 상관관계 설정 (비보장형 자산들 간의 상관관계)
+    if rule_table is None:
+        rule_table = build_rule_table()
+    category_codes = encode_categories(categories)
+    category_codes.flags.writeable = False
+
+    # 지수 팩터 모델: N×N 행렬 없이 B·F·Bᵀ + D
+    use_factor = covariance_model is not None and covariance_model.kind == 'factor'
+    if use_factor and index_links is None:
+        logger.warning("펀드별 참고 지수(매핑지수)가 없어 팩터 공분산 대신 카테고리 상관관계 사용")
+        use_factor = False
+    if use_factor:
+        corr_matrix = None
+        cov = covariance_model.build(index_links, std_devs, category_codes, rule_table)
+    else:
+        corr_matrix = _readonly(build_correlation_matrix(category_codes, rule_table))
+        cov = _readonly(np.outer(std_devs, std_devs) * corr_matrix)
+
+    return AssetUniverse(
+        names=tuple(names),
+        expected_returns=_readonly(expected_returns),
+        std_devs=_readonly(std_devs),
+        categories=tuple(categories),
+        category_codes=category_codes,
+        corr=corr_matrix,
+        cov=cov,
+        index_links=index_links,
+    )
 
 
 # 기대수익률 및 공분산 행렬 계산
-def calculate_er_sigma(principal_df, non_principal_df, A, user):
-    all_asset_names = []
-    asset_expected_returns = []
-    asset_std_devs = []
-    
-    principal_asset_indices = []
-    non_principal_asset_indices = []
-    
-    # principal_df (예금 상품) 처리
-    if not principal_df.empty:
-        principal_df['연 금리(%)'] = pd.to_numeric(principal_df['연 금리(%)'], errors='coerce')
-        filtered_principal_df = principal_df.dropna(subset=['연 금리(%)'])
-
-        if not filtered_principal_df.empty:
-            import re
-            age_num_match = re.search(r'\d+', user.age_group)
-            user_age = int(age_num_match.group()) if age_num_match else 30  # 기본값 30
-
-            if user_age >= 50:
-                age_filtered = filtered_principal_df[
-                    (filtered_principal_df['상품종류'].str.contains("정기예금")) &
-                    (filtered_principal_df['만기'].astype(str).str.contains("6개월"))
-                ]
-            elif user_age >= 40:
-                age_filtered = filtered_principal_df[
-                    filtered_principal_df['상품종류'].str.contains("저축은행정기예금")
-                ]
-            else:
-                age_filtered = filtered_principal_df
-
-            if age_filtered.empty:
-                print(f"[WARN] 나이 {user_age}세 조건을 만족하는 보장형 상품이 없습니다. 전체 상품에서 다시 선택합니다.")
-                age_filtered = filtered_principal_df  
-
-            def extract_base_product_name(product_name):
-                return product_name.split('(')[0].strip()
-
-            age_filtered['기본상품명'] = age_filtered['상품명'].apply(extract_base_product_name)
-
-            best_per_base_product = age_filtered.loc[
-                age_filtered.groupby('기본상품명')['연 금리(%)'].idxmax()
-            ]
-
-            for _, row in best_per_base_product.iterrows():
-                asset_name = f"예금_{row['상품명']}"
-                all_asset_names.append(asset_name)
-                principal_asset_indices.append(len(all_asset_names) - 1)
-                rate = row['연 금리(%)'] / 100.0
-                asset_expected_returns.append(rate)
-                asset_std_devs.append(0.001)
-        else:
-            print("[WARN] 유효한 연 금리 데이터가 있는 예금 상품을 찾을 수 없습니다.")
+# deposit_names: 예금 자산명 (datastore.AssetTable에 미리 만든 것, 없으면 여기서 생성)
+def calculate_er_sigma(principal_df, non_principal_df, A, user, universe=None, deposit_index=None, deposit_names=None):
+    if universe is None:
+        universe = build_asset_universe(non_principal_df)
+    if deposit_index is None:
+        deposit_index = build_deposit_index(principal_df)
+
+    # 연령 구간별 예금 후보 (기본상품명당 최고 금리 상품)
+    deposits = deposit_index.bucket(parse_user_age(user.age_group))
+    all_asset_names = list(deposit_names) if deposit_names is not None else [f"예금_{name}" for name in deposits.names]
+    principal_asset_indices = list(range(len(all_asset_names)))
+
+    # 예금 블록(대각) + 사전 계산된 펀드 블록을 이어 붙임 (예금-펀드 간 상관관계 0)
+    num_principal = len(principal_asset_indices)
+    num_assets = num_principal + len(universe)
+
+    ER = np.concatenate([deposits.rates / 100.0, universe.expected_returns])
+    if isinstance(universe.cov, FactorCovariance):
+        Sigma = universe.cov.prepend_diagonal(np.full(num_principal, DEPOSIT_VARIANCE))
     else:
-        print("[WARN] principal_df가 비어있습니다.")
-
-    # non_principal_df (펀드 상품) 처리
-    fund_categories = [] # 펀드 카테고리를 저장할 리스트
-    for idx, row in non_principal_df.iterrows():
-        asset_name = f"펀드_{row['상품명']}"
-        all_asset_names.append(asset_name)
-        non_principal_asset_indices.append(len(all_asset_names) - 1)
-        
-        # 펀드 기대수익률 및 표준편차 계산
-        expected_return = 0.0
-        return_found = False
-        return_period_configs = [('3년', 3), ('2년', 2), ('1년', 1), ('6개월', 0.5), ('3개월', 0.25), ('1개월', 1/12)]
-        for search_key, years_fraction in return_period_configs:
-            for full_col_name in row.index:
-                if search_key in full_col_name and '수익률' in full_col_name:
-                    val = pd.to_numeric(row[full_col_name], errors='coerce')
-                    if pd.notna(val):
-                        expected_return = (1 + val / 100) ** (1 / years_fraction) - 1
-                        return_found = True
-                        break
-            if return_found:
-                break
-        expected_return = max(expected_return, 0.01)
-        asset_expected_returns.append(expected_return)
-
-        std_candidates = []
-        for col_suffix in ['1개월', '3개월', '6개월', '1년']:
-            for full_col_name in row.index:
-                if col_suffix in full_col_name and '수익률' in full_col_name:
-                    val = pd.to_numeric(row[full_col_name], errors='coerce')
-                    if pd.notna(val):
-                        std_candidates.append(val / 100)
-
-        std_dev = max(np.std(std_candidates), 0.01) if std_candidates else 0.15
-        asset_std_devs.append(std_dev)
-
-        # --- 펀드 카테고리 분류 로직 추가 ---
-        fund_name_lower = row['상품명'].lower()
-        if '주식' in fund_name_lower:
-            if '글로벌' in fund_name_lower or '해외' in fund_name_lower:
-                fund_categories.append('글로벌주식')
-            else:
-                fund_categories.append('국내주식')
-        elif '채권' in fund_name_lower:
-            if '글로벌' in fund_name_lower or '해외' in fund_name_lower:
-                fund_categories.append('글로벌채권')
-            else:
-                fund_categories.append('국내채권')
-        elif '혼합' in fund_name_lower:
-            fund_categories.append('혼합형')
-        else:
-            fund_categories.append('기타펀드') # 분류되지 않은 펀드
-
-    ER = np.array(asset_expected_returns)
-    stds = np.array(asset_std_devs)
-
-    num_assets = len(all_asset_names)
-    corr_matrix = np.eye(num_assets)
-
-    # --- 상관관계 행렬 계산 로직 개선 ---
-    for p_idx in principal_asset_indices:
-        for np_idx in non_principal_asset_indices:
-            corr_matrix[p_idx, np_idx] = 0.0
-            corr_matrix[np_idx, p_idx] = 0.0
-
-    # 펀드 그룹별 상관관계 설정 (비보장형 자산들 간의 상관관계)
+        Sigma = np.zeros((num_assets, num_assets))
+        Sigma[np.arange(num_principal), np.arange(num_principal)] = DEPOSIT_VARIANCE
+        Sigma[num_principal:, num_principal:] = universe.cov
 
-    non_principal_fund_categories = [fund_categories[i - len(principal_asset_indices)] for i in non_principal_asset_indices]
-
-    correlation_rules = {
-        ('국내주식', '국내주식'): 0.8,
-        ('글로벌주식', '글로벌주식'): 0.8,
-        ('국내채권', '국내채권'): 0.7,
-        ('글로벌채권', '글로벌채권'): 0.7,
-        ('혼합형', '혼합형'): 0.6,
-        
-        ('국내주식', '글로벌주식'): 0.6,
-        ('국내채권', '글로벌채권'): 0.5,
-        
-        ('국내주식', '국내채권'): 0.2,
-        ('글로벌주식', '글로벌채권'): 0.2,
-        ('국내주식', '혼합형'): 0.5,
-        ('국내채권', '혼합형'): 0.4,
-    }
-
-    for i in range(len(non_principal_asset_indices)):
-        for j in range(i + 1, len(non_principal_asset_indices)):
-            idx_i = non_principal_asset_indices[i]
-            idx_j = non_principal_asset_indices[j]
-            
-            cat_i = non_principal_fund_categories[i]
-            cat_j = non_principal_fund_categories[j]
-
-            # 두 카테고리 조합에 맞는 상관관계 찾기
-            corr_val = correlation_rules.get((cat_i, cat_j), correlation_rules.get((cat_j, cat_i), 0.3)) # 기본값 0.3
-            
-            # 주식-채권처럼 특정 조합은 더 낮은 상관관계
-            if ('주식' in cat_i and '채권' in cat_j) or ('채권' in cat_i and '주식' in cat_j):
-                corr_val = 0.15 # 더 낮은 상관관계
-            elif ('주식' in cat_i and '주식' in cat_j) or ('채권' in cat_i and '채권' in cat_j):
-                pass # 이미 위에서 설정된 높은 값 사용
-            
-            corr_matrix[idx_i, idx_j] = corr_val
-            corr_matrix[idx_j, idx_i] = corr_val
-
-    Sigma = np.outer(stds, stds) * corr_matrix
+    all_asset_names.extend(universe.names)
+    non_principal_asset_indices = list(range(num_principal, num_assets))
 
     return ER, Sigma, all_asset_names, principal_asset_indices, non_principal_asset_indices
@@ -0,0 +1,236 @@
+# precompute.py
+# 설문으로 도달 가능한 모든 최적화 입력 조합을 미리 풀어 조회용 산출물로 저장하는 배치 작업
+#   python precompute.py [--data-dir data] [--out data/precomputed] [--workers N] [--solver qp]
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import SimpleNamespace
+
+import numpy as np
+
+from correlation import build_rule_table, load_correlation_rules, rule_table_digest
+from factor import CovarianceModel
+from funds import FUND_STATS_SOURCES
+from optimizer import calculate_er_sigma, get_alpha_by_A, optimize_portfolio
+from screening import ScreeningConfig, screen_funds
+from utils import (INVESTOR_ITEMS, TARGET_RISKY_MAPPING, age_bracket, build_survey_index, dataset_version,
+                   get_investor_level, parse_user_age)
+from warmstart import WarmStartStore
+
+DATA_FILES = ('irp.csv', 'update_irp_non_with_index.csv', 'final_weight_table.csv', 'invest_score.csv')
+MULTI_SELECT_ITEMS = ["투자상품경험"]
+
+# 파일명에 쓸 연령 구간 코드
+BRACKET_CODES = {"<40": "under40", "40s": "40s", "50+": "50plus"}
+
+
+# 항목별 선택지 점수 목록 → 가능한 점수 합 집합 (미응답 = 0점)
+def _reachable_sums(option_scores):
+    sums = {0.0}
+    for scores in option_scores:
+        sums = {round(s + score, 6) for s in sums for score in set(scores) | {0.0}}
+    return sums
+
+
+# (연령 구간, A, 목표 비중, alpha) 전체 열거. 안정형은 최적화를 거치지 않으므로 제외
+# 점수는 실제 채점과 같은 SurveyIndex에서 가져옴 (조건값이 중복되면 첫 행 우선)
+def enumerate_canonical_inputs(weight_df, investor_df):
+    survey_index = build_survey_index(weight_df, investor_df)
+    investor_scores = {item: {} for item in INVESTOR_ITEMS}
+    for (item, value), score in survey_index.investor_scores.items():
+        if item in investor_scores:
+            investor_scores[item][value] = float(score)
+
+    # 투자성향설문 응답별 도달 가능한 투자성향 레벨
+    levels_by_type = {}
+    for investment_type, target_risky_ratio in TARGET_RISKY_MAPPING.items():
+        if target_risky_ratio == 0.0:
+            continue
+        option_scores = []
+        for item in INVESTOR_ITEMS:
+            if item == "투자성향설문":
+                continue
+            scores = list(investor_scores[item].values())
+            if item in MULTI_SELECT_ITEMS:
+                # 복수 선택: 모든 부분집합의 합
+                scores = [sum(combo) for r in range(1, len(scores) + 1) for combo in itertools.combinations(scores, r)]
+            option_scores.append(scores)
+        base = investor_scores["투자성향설문"].get(investment_type, 0.0)
+        levels_by_type[investment_type] = {
+            get_investor_level(round(base + s, 2)) for s in _reachable_sums(option_scores)
+        }
+
+    inputs = set()
+    age_groups = {}
+    for age_group, age_score in survey_index.age_scores.items():
+        bracket = age_bracket(parse_user_age(age_group))
+        age_groups.setdefault(bracket, age_group)
+        age_score = float(age_score)
+        option_scores = [
+            [float(score) for score in scores.values()]
+            for (group, item), scores in survey_index.item_scores.items()
+            if group == age_group and item not in INVESTOR_ITEMS and item != "투자성향"
+        ]
+        item_sums = _reachable_sums(option_scores)
+
+        for investment_type, levels in levels_by_type.items():
+            target_risky_ratio = TARGET_RISKY_MAPPING[investment_type]
+            for level in levels:
+                for item_sum in item_sums:
+                    A = round(level + age_score + item_sum, 2)
+                    inputs.add((bracket, A, target_risky_ratio, get_alpha_by_A(A)))
+
+    return sorted(inputs), age_groups
+
+
+_WORKER = {}
+
+
+def _init_worker(data_dir, solver, correlation_rules_path, fund_stats, screening, covariance_model):
+    from snapshot import read_csv_dataset  # snapshot이 이 모듈을 import하므로 지연 import
+
+    # 워커당 BLAS 스레드 1개 (프로세스 수만큼만 코어 사용)
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(var, '1')
+    rules = load_correlation_rules(correlation_rules_path) if correlation_rules_path else None
+    dataset = read_csv_dataset(data_dir, rule_table=build_rule_table(rules), fund_stats=fund_stats,
+                               covariance_model=covariance_model)
+    _WORKER.update(
+        deposit_index=dataset.deposit_index,
+        universe=dataset.fund_universe,
+        solver=solver,
+        screening=screening,
+    )
+
+
+# 같은 (연령 구간, 목표 비중) 그룹을 A 순서로 풀며 이웃 해를 초기값으로 재사용
+def _solve_group(bracket, age_group, target_risky_ratio, A_values):
+    user = SimpleNamespace(age_group=age_group)
+    ER, Sigma, asset_names, principal_asset_indices, non_principal_asset_indices = calculate_er_sigma(
+        None, None, A_values[0], user,
+        universe=_WORKER['universe'], deposit_index=_WORKER['deposit_index'])
+    warm_start = WarmStartStore()
+    rows = []
+    screening = _WORKER['screening']
+    for A in A_values:
+        alpha = get_alpha_by_A(A)
+        active = (screen_funds(_WORKER['universe'], A, screening, offset=len(principal_asset_indices)).active
+                  if screening.enabled else None)
+        weights, _ = optimize_portfolio(
+            ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio, alpha,
+            solver=_WORKER['solver'], warm_start=warm_start, active=active)
+        rows.append((A, target_risky_ratio, alpha, weights))
+    return bracket, asset_names, rows
+
+
+def build_precomputed_table(data_dir='data', out_dir=None, workers=None, solver='qp', correlation_rules_path=None,
+                            fund_stats='period', screening=None, covariance_model=None):
+    import pandas as pd
+
+    screening = screening if screening is not None else ScreeningConfig()
+    covariance_model = covariance_model if covariance_model is not None else CovarianceModel()
+    out_dir = out_dir or os.path.join(data_dir, 'precomputed')
+    weight_df = pd.read_csv(os.path.join(data_dir, 'final_weight_table.csv'), encoding='utf-8')
+    investor_df = pd.read_csv(os.path.join(data_dir, 'invest_score.csv'), encoding='utf-8')
+    inputs, age_groups = enumerate_canonical_inputs(weight_df, investor_df)
+
+    groups = {}
+    for bracket, A, target_risky_ratio, _ in inputs:
+        groups.setdefault((bracket, target_risky_ratio), []).append(A)
+
+    started = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(data_dir, solver, correlation_rules_path, fund_stats, screening,
+                                       covariance_model)) as pool:
+        futures = [
+            pool.submit(_solve_group, bracket, age_groups[bracket], target_risky_ratio, sorted(A_values))
+            for (bracket, target_risky_ratio), A_values in groups.items()
+        ]
+        for future in as_completed(futures):
+            bracket, asset_names, rows = future.result()
+            entry = results.setdefault(bracket, {"asset_names": asset_names, "rows": []})
+            entry["rows"].extend(rows)
+
+    os.makedirs(out_dir, exist_ok=True)
+    meta = {
+        "dataset_version": dataset_version(os.path.join(data_dir, name) for name in DATA_FILES),
+        "solver": solver,
+        "correlation_rules": correlation_rules_path,
+        "correlation_digest": rule_table_digest(build_rule_table(
+            load_correlation_rules(correlation_rules_path) if correlation_rules_path else None)),
+        "fund_stats": fund_stats,
+        "screening": screening.as_dict(),
+        "covariance": covariance_model.as_dict(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "brackets": {},
+    }
+    for bracket, entry in results.items():
+        rows = sorted(entry["rows"], key=lambda row: (row[1], row[0]))
+        code = BRACKET_CODES[bracket]
+        keys = np.array([(A, target_risky_ratio, alpha) for A, target_risky_ratio, alpha, _ in rows], dtype=np.float64)
+        weights = np.vstack([w for *_, w in rows]).astype(np.float32)
+        np.save(os.path.join(out_dir, f"keys_{code}.npy"), keys)
+        np.save(os.path.join(out_dir, f"weights_{code}.npy"), weights)
+        meta["brackets"][bracket] = {"code": code, "rows": len(rows), "asset_names": list(entry["asset_names"])}
+
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    print(f"[PRECOMPUTE] {len(inputs)}개 조합 ({len(groups)}개 그룹) → {out_dir} "
+          f"({time.perf_counter() - started:.1f}s)")
+    return meta
+
+
+# 미리 계산된 추천표 조회 (가중치는 메모리 맵으로 읽음)
+class PrecomputedTable:
+    def __init__(self, meta, keys, weights):
+        self.meta = meta
+        self.dataset_version = meta["dataset_version"]
+        self._asset_names = {bracket: tuple(info["asset_names"]) for bracket, info in meta["brackets"].items()}
+        self._weights = weights
+        self._index = {
+            (bracket, round(float(A), 2), round(float(target_risky_ratio), 2)): row
+            for bracket, bracket_keys in keys.items()
+            for row, (A, target_risky_ratio, _) in enumerate(bracket_keys)
+        }
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        keys, weights = {}, {}
+        for bracket, info in meta["brackets"].items():
+            keys[bracket] = np.load(os.path.join(path, f"keys_{info['code']}.npy"))
+            weights[bracket] = np.load(os.path.join(path, f"weights_{info['code']}.npy"), mmap_mode='r')
+        return cls(meta, keys, weights)
+
+    def lookup(self, bracket, A, target_risky_ratio):
+        row = self._index.get((bracket, round(float(A), 2), round(float(target_risky_ratio), 2)))
+        if row is None:
+            return None
+        return self._asset_names[bracket], np.asarray(self._weights[bracket][row], dtype=float)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IRP 추천 결과 사전 계산")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--out", default=None, help="산출물 디렉터리 (기본: <data-dir>/precomputed)")
+    parser.add_argument("--workers", type=int, default=None, help="프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument("--solver", default=os.environ.get('IRP_SOLVER', 'qp'))
+    parser.add_argument("--correlation-rules", default=os.environ.get('IRP_CORRELATION_RULES'))
+    parser.add_argument("--fund-stats", default=os.environ.get('IRP_FUND_STATS', 'period'), choices=FUND_STATS_SOURCES)
+    args = parser.parse_args()
+    # 후보 축소/공분산 모델은 서버와 같은 환경 변수(IRP_SCREEN_*, IRP_COVARIANCE_MODEL)를 따름 (다르면 서버가 표를 쓰지 않음)
+    build_precomputed_table(args.data_dir, args.out, args.workers, args.solver, args.correlation_rules,
+                            args.fund_stats, ScreeningConfig.from_env(), CovarianceModel.from_env(args.data_dir))
+
+
+if __name__ == "__main__":
+    main()
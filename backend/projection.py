@@ -0,0 +1,245 @@
+# projection.py
+# 추천 포트폴리오의 은퇴 시점까지 적립금 전망 (백분위 구간, 원금/목표 미달 확률)
+#   - 몬테카를로: 매년 추천 비중으로 재조정하면 연 수익률 = w·r 하나의 분포(평균 w·ER, 분산 w'Σw)
+#     → 자산 수와 무관하게 경로 × 연도 난수만 생성 (로그정규)
+#   - 과거 재현: 로컬 지수 시계열(티커별 가격)의 월간 수익률을 펀드별 참고 지수 비중으로 합성해
+#     모든 시작 월에서 순환 재생 (지수와 연결되지 않은 몫과 예금은 기대수익률로 고정)
+#   적립: 매년 초 annual_contribution 납입 후 1년 운용
+#   연도별 백분위/원금 미달 비율은 한 해씩 계산 → 메모리는 경로 수에만 비례 (경로 × 연수 행렬을 만들지 않음)
+#   python projection.py [--age-group 30대] [--A 5] [--target 0.6] [--years 25] [--paths 20000] [--series data/index_series.csv]
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from factor import index_exposures
+
+PERCENTILES = (5, 25, 50, 75, 95)
+RETIREMENT_AGE = 55             # IRP 연금 수령 개시 연령 (기간 미지정 시 기본 운용 기간 계산)
+
+
+# 연도별 총수익률(경로별 벡터) → 연초 납입 후 연도별 적립금 (첫 값 = 초기 적립금)
+def accumulate(gross_by_year, num_paths, initial_balance, annual_contribution):
+    balance = np.full(num_paths, float(initial_balance))
+    yield balance
+    for gross in gross_by_year:
+        balance = (balance + annual_contribution) * gross
+        yield balance
+
+
+# 포트폴리오 연 기대수익률/분산 (Sigma는 행렬곱만 사용 → FactorCovariance도 가능)
+def portfolio_moments(weights, ER, Sigma):
+    weights = np.asarray(weights, dtype=float)
+    return float(weights @ ER), float(max(weights @ (Sigma @ weights), 0.0))
+
+
+@dataclass(frozen=True)
+class Projection:
+    mode: str                   # 'monte_carlo' 또는 'historical'
+    percentiles: tuple
+    bands: np.ndarray           # 백분위 수 × (연수 + 1) 연도별 적립금 백분위
+    principal_shortfall: np.ndarray  # 연도별 적립금 < 누적 납입 원금 비율 (연수 + 1)
+    final_balances: np.ndarray  # 경로별 최종 적립금 (목표 미달 확률용)
+    contributed: np.ndarray     # 연도별 누적 납입 원금 (연수 + 1)
+    annual_return: float        # 몬테카를로: w·ER, 과거 재현: 연 수익률 평균
+    annual_volatility: float
+    seconds: float
+    details: dict
+
+    @property
+    def paths(self):
+        return len(self.final_balances)
+
+    @property
+    def years(self):
+        return self.bands.shape[1] - 1
+
+    def shortfall_probability(self, goal=None):
+        return float(np.mean(self.final_balances < (self.contributed[-1] if goal is None else goal)))
+
+    def summary(self, goal=None):
+        shortfall = {"principal": self.shortfall_probability()}
+        if goal is not None:
+            shortfall["goal"] = self.shortfall_probability(goal)
+        return {
+            "mode": self.mode,
+            "years": self.years,
+            "paths": self.paths,
+            "annual_return": round(self.annual_return, 6),
+            "annual_volatility": round(self.annual_volatility, 6),
+            "contributed": [round(float(c), 2) for c in self.contributed],
+            "percentiles": {f"p{p}": [round(float(b), 2) for b in band] for p, band in zip(self.percentiles, self.bands)},
+            "final_mean": round(float(self.final_balances.mean()), 2),
+            "shortfall_probability": shortfall,
+            "principal_shortfall_by_year": [round(float(p), 4) for p in self.principal_shortfall],
+            "seconds": round(self.seconds, 4),
+            **self.details,
+        }
+
+
+def _contributed(years, initial_balance, annual_contribution):
+    return initial_balance + annual_contribution * np.arange(years + 1, dtype=float)
+
+
+# 연도별 적립금(경로별 벡터)을 한 해씩 받아 백분위/원금 미달 비율만 남김 → 마지막 해 적립금과 함께 반환
+def _year_stats(balances_by_year, contributed, percentiles):
+    bands, shortfall = [], []
+    for year, balance in enumerate(balances_by_year):
+        bands.append(np.percentile(balance, percentiles))
+        shortfall.append(np.mean(balance < contributed[year]))
+    return np.column_stack(bands), np.array(shortfall), balance
+
+
+# 몬테카를로 전망: 시드가 같으면 같은 결과 (한 해 분량의 난수를 경로 수만큼 순서대로 생성)
+def project_portfolio(weights, ER, Sigma, years, paths=20000, initial_balance=0.0, annual_contribution=0.0,
+                      seed=0, percentiles=PERCENTILES):
+    started = time.perf_counter()
+    mean, variance = portfolio_moments(weights, ER, Sigma)
+    # 총수익률 1 + r 의 평균/분산이 (1 + mean, variance)가 되는 로그정규 분포
+    log_var = np.log1p(variance / (1.0 + mean) ** 2)
+    log_mean = np.log1p(mean) - log_var / 2
+    log_std = np.sqrt(log_var)
+
+    rng = np.random.default_rng(seed)
+    gross_by_year = (np.exp(log_mean + log_std * rng.standard_normal(paths)) for _ in range(years))
+    contributed = _contributed(years, initial_balance, annual_contribution)
+    bands, principal_shortfall, final_balances = _year_stats(
+        accumulate(gross_by_year, paths, initial_balance, annual_contribution), contributed, percentiles)
+    return Projection(
+        mode="monte_carlo",
+        percentiles=tuple(percentiles),
+        bands=bands,
+        principal_shortfall=principal_shortfall,
+        final_balances=final_balances,
+        contributed=contributed,
+        annual_return=mean,
+        annual_volatility=float(np.sqrt(variance)),
+        seconds=time.perf_counter() - started,
+        details={"seed": seed},
+    )
+
+
+# 지수 월간 수익률 (라벨 = 공백을 뺀 티커, factor.IndexLinks 라벨과 같은 규칙)
+@dataclass(frozen=True)
+class IndexSeries:
+    labels: tuple
+    months: tuple               # 'YYYY-MM'
+    returns: np.ndarray         # 월 수 × 지수 수
+    source: str
+
+    def __len__(self):
+        return len(self.months)
+
+
+# CSV: 첫 열 = 날짜, 나머지 열 = 티커별 가격(종가). 월말 가격 → 월간 수익률
+# 시계열이 늦게 시작하는 지수의 빈 달은 그 지수의 평균 월 수익률로 채움
+def load_index_series(path, min_months=12):
+    import pandas as pd
+
+    df = pd.read_csv(path, index_col=0, encoding='utf-8')
+    df.index = pd.to_datetime(df.index)
+    df.columns = ["".join(str(col).split()) for col in df.columns]
+    prices = df.sort_index().apply(pd.to_numeric, errors='coerce').groupby(df.index.to_period('M')).last()
+    returns = prices.pct_change(fill_method=None).iloc[1:]
+    returns = returns.loc[:, returns.notna().any()]
+    if len(returns) < min_months:
+        raise ValueError(f"지수 시계열이 {min_months}개월보다 짧습니다: {path} ({len(returns)}개월)")
+    returns = returns.fillna(returns.mean())
+    values = np.ascontiguousarray(returns.to_numpy(dtype=float))
+    values.flags.writeable = False
+    return IndexSeries(labels=tuple(returns.columns), months=tuple(str(m) for m in returns.index),
+                       returns=values, source=path)
+
+
+# 과거 재현: 매월 추천 비중으로 재조정한 포트폴리오 월 수익률을 모든 시작 월에서 years년 동안 순환 재생 (경로 수 = 월 수)
+# weights/ER: 전체 자산 순서 (예금 num_principal개 → 펀드), index_links: 펀드 유니버스의 factor.IndexLinks
+def replay_portfolio(weights, ER, num_principal, index_links, series, years, initial_balance=0.0,
+                     annual_contribution=0.0, percentiles=PERCENTILES):
+    started = time.perf_counter()
+    weights = np.asarray(weights, dtype=float)
+    ER = np.asarray(ER, dtype=float)
+    monthly_er = np.expm1(np.log1p(ER) / 12)
+    fund_weights = weights[num_principal:]
+
+    exposures, _ = index_exposures(index_links, series.labels)
+    uncovered = np.clip(1.0 - exposures.sum(axis=1), 0.0, None)
+    # 포트폴리오 월 수익률 = 지수 수익률 · (펀드 비중 × 지수 비중) + 고정 수익(예금, 지수 미연결 몫)
+    fixed = weights[:num_principal] @ monthly_er[:num_principal] + fund_weights @ (uncovered * monthly_er[num_principal:])
+    monthly = series.returns @ (exposures.T @ fund_weights) + fixed
+
+    num_months = len(monthly)
+    months = (np.arange(num_months)[:, None] + np.arange(years * 12)[None, :]) % num_months
+    gross = np.prod((1.0 + monthly[months]).reshape(num_months, years, 12), axis=2)
+    annual = np.prod((1.0 + monthly[(np.arange(num_months)[:, None] + np.arange(12)) % num_months]), axis=1) - 1
+    contributed = _contributed(years, initial_balance, annual_contribution)
+    bands, principal_shortfall, final_balances = _year_stats(
+        accumulate(gross.T, num_months, initial_balance, annual_contribution), contributed, percentiles)
+    return Projection(
+        mode="historical",
+        percentiles=tuple(percentiles),
+        bands=bands,
+        principal_shortfall=principal_shortfall,
+        final_balances=final_balances,
+        contributed=contributed,
+        annual_return=float(annual.mean()),
+        annual_volatility=float(annual.std()),
+        seconds=time.perf_counter() - started,
+        details={
+            "history": {"source": series.source, "start": series.months[0], "end": series.months[-1],
+                        "months": num_months},
+            # 지수 시계열로 재현된 비중 (나머지는 기대수익률로 고정)
+            "index_coverage": round(float(fund_weights @ (1.0 - uncovered)), 4),
+        },
+    )
+
+
+# 설문 연령대 → 기본 운용 기간 (최소 1년)
+def default_horizon(user_age):
+    return max(RETIREMENT_AGE - user_age, 1)
+
+
+def main():
+    from types import SimpleNamespace
+
+    from optimizer import calculate_er_sigma, optimize_portfolio
+    from snapshot import read_csv_dataset
+    from utils import parse_user_age
+
+    parser = argparse.ArgumentParser(description="추천 포트폴리오 적립금 전망 (몬테카를로 / 과거 재현)")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--age-group", default="30대")
+    parser.add_argument("--A", type=float, default=5.0)
+    parser.add_argument("--target", type=float, default=0.6)
+    parser.add_argument("--years", type=int, default=None, help=f"운용 기간 (기본: {RETIREMENT_AGE}세까지)")
+    parser.add_argument("--paths", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--initial", type=float, default=10_000_000)
+    parser.add_argument("--contribution", type=float, default=0.0)
+    parser.add_argument("--series", default=None, help="지수 시계열 CSV (지정하면 과거 재현도 실행)")
+    args = parser.parse_args()
+
+    dataset = read_csv_dataset(args.data_dir)
+    user = SimpleNamespace(age_group=args.age_group)
+    ER, Sigma, _, principal_asset_indices, non_principal_asset_indices = calculate_er_sigma(
+        None, None, args.A, user, universe=dataset.fund_universe, deposit_index=dataset.deposit_index)
+    weights, _ = optimize_portfolio(ER, Sigma, args.A, principal_asset_indices, non_principal_asset_indices,
+                                    args.target, solver='qp')
+    years = args.years or default_horizon(parse_user_age(args.age_group))
+
+    projections = [project_portfolio(weights, ER, Sigma, years, args.paths, args.initial, args.contribution, args.seed)]
+    if args.series:
+        projections.append(replay_portfolio(weights, ER, len(principal_asset_indices),
+                                            dataset.fund_universe.index_links, load_index_series(args.series),
+                                            years, args.initial, args.contribution))
+    for projection in projections:
+        summary = projection.summary()
+        print(f"[PROJECTION] {summary['mode']}: {years}년 / 경로 {summary['paths']}개 / {summary['seconds'] * 1000:.1f}ms")
+        print(f"  연 수익률 {summary['annual_return']:.2%}, 변동성 {summary['annual_volatility']:.2%}, "
+              f"원금 미달 확률 {summary['shortfall_probability']['principal']:.1%}")
+        for name, band in summary["percentiles"].items():
+            print(f"  {name}: {band[-1]:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# rendering.py
+# 포트폴리오 파이 차트 렌더링: pyplot 전역 상태 없이 Figure API 사용, 결과 바이트 캐시
+# (matplotlib은 첫 렌더링 때 import → 서버 시작 시간에 포함되지 않음)
+import threading
+from io import BytesIO
+
+from cache import ResultCache
+
+CHART_TITLE = "추천 포트폴리오 자산 비중"
+MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def shorten_label(name):
+    return name[:18] + "…" if len(name) > 20 else name
+
+
+def _normalize(values):
+    total = sum(values)
+    return [v / total for v in values] if total > 0 else list(values)
+
+
+class ChartRenderer:
+    def __init__(self, max_entries=256, weight_decimals=4, font_family="Malgun Gothic", figsize=(6, 6)):
+        self.weight_decimals = weight_decimals
+        self.font_family = font_family
+        self.figsize = figsize
+        self.cache = ResultCache(max_entries=max_entries, ttl_seconds=None)
+        self._local = threading.local()  # 스레드별로 Figure/Canvas 재사용
+
+    def _figure(self):
+        fig = getattr(self._local, "figure", None)
+        if fig is None:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+
+            fig = Figure(figsize=self.figsize)
+            FigureCanvasAgg(fig)
+            self._local.figure = fig
+        fig.clear()
+        return fig
+
+    # 같은 구성(자산명, 반올림 비중)이면 같은 차트
+    def fingerprint(self, names, values):
+        return tuple(names), tuple(round(float(v), self.weight_decimals) for v in values)
+
+    # 클라이언트 측 렌더링용 차트 명세
+    def chart_spec(self, names, values):
+        weights = _normalize([float(v) for v in values])
+        return {
+            "type": "pie",
+            "title": CHART_TITLE,
+            "labels": list(names),
+            "display_labels": [shorten_label(name) for name in names],
+            "values": [round(w, self.weight_decimals) for w in weights],
+            "percent_labels": [f"{w * 100:.1f}%" for w in weights],
+        }
+
+    def render(self, names, values, fmt="png"):
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"지원하지 않는 차트 형식입니다: {fmt} (가능: {', '.join(MEDIA_TYPES)}, json)")
+        key = self.fingerprint(names, values) + (fmt,)
+        content = self.cache.get(key)
+        if content is None:
+            content = self._draw(names, values, fmt)
+            self.cache.put(key, content)
+        return content, MEDIA_TYPES[fmt]
+
+    # 글꼴은 전역 rcParams 대신 텍스트별 FontProperties로 지정 (스레드 간 경합 없음)
+    def _draw(self, names, values, fmt):
+        from matplotlib.font_manager import FontProperties
+
+        font = FontProperties(family=self.font_family)
+        fig = self._figure()
+        ax = fig.add_subplot()
+        ax.pie(_normalize(values), labels=[shorten_label(name) for name in names], autopct='%1.1f%%', startangle=90,
+               textprops={"fontproperties": font})
+        ax.axis('equal')
+        ax.set_title(CHART_TITLE, fontproperties=font)
+
+        buf = BytesIO()
+        fig.savefig(buf, format=fmt, bbox_inches="tight")
+        fig.clear()
+        return buf.getvalue()
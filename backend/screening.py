@@ -0,0 +1,183 @@
+# screening.py
+# 최적화 전 펀드 후보 축소: 지배 관계 제거 → 카테고리별 상위 k → 전체 상위 N (효용점수 = 수익률 - A × 변동성)
+# 예금(보장형)은 모두 남기고, 남은 자산만으로 최적화한 뒤 원래 자산 순서로 되돌림
+#   python screening.py [--data-dir data] [--solver qp]   # 전체 최적화 대비 목적함수 차이/속도 평가
+import argparse
+import os
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from utils import fund_utility_scores
+
+
+@dataclass(frozen=True)
+class ScreeningConfig:
+    dominance: bool = False     # 같은 카테고리에 수익률이 더 높고 변동성이 더 낮은 펀드가 있으면 제거
+    per_category: int = 0       # 카테고리별 효용점수 상위 k개만 (0 = 제한 없음)
+    top_n: int = 0              # 전체 효용점수 상위 N개만 (0 = 제한 없음)
+
+    @property
+    def enabled(self):
+        return self.dominance or self.per_category > 0 or self.top_n > 0
+
+    # IRP_SCREEN_DOMINANCE=1, IRP_SCREEN_PER_CATEGORY=k, IRP_SCREEN_TOP_N=N (기본은 데이터클래스와 같이 모두 끔)
+    # 후보 축소는 전체 최적화와 결과가 달라질 수 있어 명시적으로 켤 때만 사용
+    # (지배 관계 제거: 목적함수 차이 평균 ~5e-6, 최적화 ~1.8배 빠름 / 효용점수 상위 k/N: 상관관계를 보지 않아 차이 ~5e-2 이상)
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(
+            dominance=environ.get('IRP_SCREEN_DOMINANCE', '0').lower() in ('1', 'true', 'yes'),
+            per_category=int(environ.get('IRP_SCREEN_PER_CATEGORY', 0)),
+            top_n=int(environ.get('IRP_SCREEN_TOP_N', 0)),
+        )
+
+    def as_dict(self):
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class ScreenResult:
+    active: np.ndarray      # 최적화에 쓸 자산 위치 (전체 자산 기준 오름차순, 예금 포함)
+    total_funds: int
+    pruned: dict            # 단계 → 제거된 펀드 수
+
+    @property
+    def kept_funds(self):
+        return self.total_funds - sum(self.pruned.values())
+
+    def report(self):
+        return {"total_funds": self.total_funds, "kept_funds": self.kept_funds, "pruned": dict(self.pruned)}
+
+
+# 같은 그룹 안에서 (변동성 더 낮고 수익률 더 높은) 펀드가 있는지: 변동성 오름차순 정렬 후 누적 최대 수익률과 비교
+def dominated_mask(returns, volatilities, groups):
+    dominated = np.zeros(len(returns), dtype=bool)
+    for group in np.unique(groups):
+        members = np.flatnonzero(groups == group)
+        order = members[np.lexsort((-returns[members], volatilities[members]))]
+        vols, rets = volatilities[order], returns[order]
+        best_so_far = np.maximum.accumulate(rets)
+        first_same_vol = np.searchsorted(vols, vols, side='left')
+        best_lower_vol = np.where(first_same_vol > 0, best_so_far[np.maximum(first_same_vol - 1, 0)], -np.inf)
+        dominated[order] = best_lower_vol > rets
+    return dominated
+
+
+# 그룹별 점수 상위 k개
+def top_k_per_group(scores, groups, k, candidates):
+    keep = np.zeros(len(scores), dtype=bool)
+    for group in np.unique(groups[candidates]):
+        members = np.flatnonzero(candidates & (groups == group))
+        keep[members[np.argsort(-scores[members], kind='stable')[:k]]] = True
+    return keep
+
+
+def screen_funds(universe, A, config, offset=0):
+    returns, volatilities = universe.expected_returns, universe.std_devs
+    groups = universe.category_codes
+    num_funds = len(universe)
+    scores = fund_utility_scores(returns, volatilities, A)
+    candidates = np.ones(num_funds, dtype=bool)
+    pruned = {}
+
+    if config.dominance:
+        dropped = candidates & dominated_mask(returns, volatilities, groups)
+        candidates &= ~dropped
+        pruned["dominance"] = int(dropped.sum())
+
+    if config.per_category > 0:
+        kept = top_k_per_group(scores, groups, config.per_category, candidates)
+        pruned["per_category"] = int((candidates & ~kept).sum())
+        candidates &= kept
+
+    if config.top_n > 0 and candidates.sum() > config.top_n:
+        members = np.flatnonzero(candidates)
+        kept = np.zeros(num_funds, dtype=bool)
+        kept[members[np.argsort(-scores[members], kind='stable')[:config.top_n]]] = True
+        pruned["top_n"] = int((candidates & ~kept).sum())
+        candidates &= kept
+
+    active = np.concatenate([np.arange(offset), offset + np.flatnonzero(candidates)])
+    return ScreenResult(active=active, total_funds=num_funds, pruned=pruned)
+
+
+# 전체 최적화와 후보 축소 최적화 비교 (목적함수는 둘 다 전체 자산 기준으로 평가)
+def evaluate_screening(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio, alpha,
+                       screen, solver='qp'):
+    from optimizer import optimize_portfolio, utility_function
+
+    started = time.perf_counter()
+    full_weights, _ = optimize_portfolio(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices,
+                                         target_risky_ratio, alpha, solver=solver)
+    full_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    screened_weights, _ = optimize_portfolio(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices,
+                                             target_risky_ratio, alpha, solver=solver, active=screen.active)
+    screened_seconds = time.perf_counter() - started
+
+    full_objective = utility_function(full_weights, ER, Sigma, A, alpha)
+    screened_objective = utility_function(screened_weights, ER, Sigma, A, alpha)
+    return {
+        **screen.report(),
+        "objective_full": float(full_objective),
+        "objective_screened": float(screened_objective),
+        "objective_delta": float(screened_objective - full_objective),
+        "seconds_full": full_seconds,
+        "seconds_screened": screened_seconds,
+        "nonzero_full": int((full_weights > 0.001).sum()),
+        "nonzero_screened": int((screened_weights > 0.001).sum()),
+    }
+
+
+def main():
+    import pandas as pd
+    from types import SimpleNamespace
+
+    from factor import CovarianceModel
+    from optimizer import calculate_er_sigma, get_alpha_by_A
+    from precompute import enumerate_canonical_inputs
+    from snapshot import read_csv_dataset
+
+    parser = argparse.ArgumentParser(description="펀드 후보 축소 효과 평가 (전체 최적화 대비)")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--solver", default=os.environ.get('IRP_SOLVER', 'qp'))
+    parser.add_argument("--fund-stats", default=os.environ.get('IRP_FUND_STATS', 'period'))
+    parser.add_argument("--dominance", action="store_true")
+    parser.add_argument("--per-category", type=int, default=0)
+    parser.add_argument("--top-n", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=30, help="평가할 입력 조합 수 (균등 간격 추출)")
+    args = parser.parse_args()
+
+    config = ScreeningConfig(dominance=args.dominance, per_category=args.per_category, top_n=args.top_n)
+    dataset = read_csv_dataset(args.data_dir, fund_stats=args.fund_stats,
+                               covariance_model=CovarianceModel.from_env(args.data_dir))
+    weight_df = pd.read_csv(os.path.join(args.data_dir, 'final_weight_table.csv'), encoding='utf-8')
+    investor_df = pd.read_csv(os.path.join(args.data_dir, 'invest_score.csv'), encoding='utf-8')
+    inputs, age_groups = enumerate_canonical_inputs(weight_df, investor_df)
+    sample = [inputs[i] for i in np.linspace(0, len(inputs) - 1, min(args.samples, len(inputs))).astype(int)]
+
+    rows = []
+    for bracket, A, target_risky_ratio, alpha in sample:
+        ER, Sigma, _, principal_asset_indices, non_principal_asset_indices = calculate_er_sigma(
+            None, None, A, SimpleNamespace(age_group=age_groups[bracket]),
+            universe=dataset.fund_universe, deposit_index=dataset.deposit_index)
+        screen = screen_funds(dataset.fund_universe, A, config, offset=len(principal_asset_indices))
+        rows.append(evaluate_screening(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices,
+                                       target_risky_ratio, get_alpha_by_A(A), screen, args.solver))
+
+    deltas = np.array([row["objective_delta"] for row in rows])
+    print(f"[SCREEN] 설정 {config.as_dict()} / {len(rows)}개 조합")
+    print(f"[SCREEN] 남은 펀드 평균 {np.mean([row['kept_funds'] for row in rows]):.1f}/{rows[0]['total_funds']}, "
+          f"제거 내역 예: {rows[-1]['pruned']}")
+    print(f"[SCREEN] 목적함수 차이(축소 - 전체, 작을수록 좋음): 평균 {deltas.mean():+.2e}, 최대 {deltas.max():+.2e}")
+    print(f"[SCREEN] 최적화 시간: 전체 {sum(r['seconds_full'] for r in rows):.2f}s → "
+          f"축소 {sum(r['seconds_screened'] for r in rows):.2f}s, "
+          f"비중>0.1% 자산 수 평균 {np.mean([r['nonzero_full'] for r in rows]):.1f} → "
+          f"{np.mean([r['nonzero_screened'] for r in rows]):.1f}")
+
+
+if __name__ == "__main__":
+    main()
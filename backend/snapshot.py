@@ -0,0 +1,207 @@
+# snapshot.py
+# 서버 시작용 데이터 스냅샷: CSV 4개를 빌드 시점에 .npz 한 파일로 컴파일 (로드할 때 pandas/CSV 파싱 없음)
+#   python snapshot.py [--data-dir data] [--out data/snapshot.npz]
+import argparse
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from factor import IndexLinks
+from funds import FUND_STATS_SOURCES, load_fund_table
+from optimizer import AssetUniverse, assemble_asset_universe, universe_from_fund_table
+from precompute import BRACKET_CODES, DATA_FILES
+from utils import DepositBucket, DepositIndex, SurveyIndex, build_deposit_index, build_survey_index, dataset_version
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+DEPOSIT_FIELDS = ('names', 'rates', 'ranked_names', 'ranked_rates', 'cumulative_ratio')
+INDEX_LINK_FIELDS = ('primary', 'primary_weights', 'secondary', 'secondary_weights')
+
+
+# 서버가 요청 처리에 쓰는 데이터 (CSV 또는 스냅샷에서 생성)
+@dataclass(frozen=True)
+class Dataset:
+    version: str
+    survey_index: SurveyIndex
+    deposit_index: DepositIndex
+    fund_universe: AssetUniverse
+    source: str             # "csv" 또는 "snapshot"
+    fund_stats: str = 'period'  # 펀드 기대수익률/변동성 기준 (funds.FUND_STATS_SOURCES)
+    fund_report: dict = None    # 펀드 로더 보고 (거른 행, 지수 값 대체 행)
+
+
+def data_paths(data_dir):
+    return [os.path.join(data_dir, name) for name in DATA_FILES]
+
+
+def read_csv_dataset(data_dir='data', rule_table=None, fund_stats='period', covariance_model=None):
+    import pandas as pd
+
+    principal_path, non_principal_path, weight_path, investor_path = data_paths(data_dir)
+    principal_df = pd.read_csv(principal_path, encoding='utf-8')
+    fund_table = load_fund_table(non_principal_path, fund_stats=fund_stats)
+    risk_weight_df = pd.read_csv(weight_path, encoding='utf-8')
+    investor_df = pd.read_csv(investor_path, encoding='utf-8')
+    return Dataset(
+        version=dataset_version(data_paths(data_dir)),
+        survey_index=build_survey_index(risk_weight_df, investor_df),
+        deposit_index=build_deposit_index(principal_df),
+        fund_universe=universe_from_fund_table(fund_table, rule_table=rule_table, covariance_model=covariance_model),
+        source="csv",
+        fund_stats=fund_stats,
+        fund_report=fund_table.report(),
+    )
+
+
+# numpy 스칼라 → JSON에 넣을 수 있는 파이썬 값
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _survey_to_json(survey_index):
+    return {
+        "investor_scores": [[_plain(item), _plain(value), _plain(score)]
+                            for (item, value), score in survey_index.investor_scores.items()],
+        "age_scores": [[_plain(age_group), _plain(score)] for age_group, score in survey_index.age_scores.items()],
+        "item_scores": [[_plain(age_group), _plain(item), [[_plain(value), _plain(score)] for value, score in scores.items()]]
+                        for (age_group, item), scores in survey_index.item_scores.items()],
+    }
+
+
+def _survey_from_json(data):
+    return SurveyIndex(
+        investor_scores={(item, value): score for item, value, score in data["investor_scores"]},
+        age_scores={age_group: score for age_group, score in data["age_scores"]},
+        item_scores={(age_group, item): {value: score for value, score in scores}
+                     for age_group, item, scores in data["item_scores"]},
+    )
+
+
+def build_snapshot(data_dir='data', out_path=None, fund_stats='period'):
+    out_path = out_path or os.path.join(data_dir, 'snapshot.npz')
+    started = time.perf_counter()
+    dataset = read_csv_dataset(data_dir, fund_stats=fund_stats)
+
+    universe = dataset.fund_universe
+    arrays = {
+        "fund_names": np.array(universe.names, dtype=str),
+        "fund_categories": np.array(universe.categories, dtype=str),
+        "fund_expected_returns": universe.expected_returns,
+        "fund_std_devs": universe.std_devs,
+    }
+    if universe.index_links is not None:
+        for field in INDEX_LINK_FIELDS:
+            values = getattr(universe.index_links, field)
+            arrays[f"fund_index_{field}"] = np.array(values, dtype=str) if isinstance(values, tuple) else values
+    for bracket, bucket in dataset.deposit_index.buckets.items():
+        for field in DEPOSIT_FIELDS:
+            values = getattr(bucket, field)
+            arrays[f"deposit_{BRACKET_CODES[bracket]}_{field}"] = (
+                np.array(values, dtype=str) if isinstance(values, tuple) else values)
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "dataset_version": dataset.version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "brackets": {bracket: BRACKET_CODES[bracket] for bracket in dataset.deposit_index.buckets},
+        "fund_stats": fund_stats,
+        "fund_report": dataset.fund_report,
+        "survey_index": _survey_to_json(dataset.survey_index),
+    }
+    arrays["meta"] = np.array(json.dumps(meta, ensure_ascii=False))
+
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    tmp_path = out_path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, out_path)  # 서버가 쓰는 도중의 파일을 읽지 않도록 교체
+
+    print(f"[SNAPSHOT] 데이터 버전 {dataset.version} → {out_path} "
+          f"({os.path.getsize(out_path) / 1024:.0f}KB, {time.perf_counter() - started:.2f}s)")
+    return meta
+
+
+# 상관관계 규칙/공분산 모델은 로드 시점에 적용 (바뀌어도 스냅샷을 다시 만들 필요 없음)
+def load_snapshot(path, rule_table=None, covariance_model=None):
+    with np.load(path) as npz:
+        meta = json.loads(str(npz["meta"]))
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"지원하지 않는 스냅샷 형식입니다: {meta.get('format')} (필요: {SNAPSHOT_FORMAT})")
+
+        buckets = {}
+        for bracket, code in meta["brackets"].items():
+            fields = {field: npz[f"deposit_{code}_{field}"] for field in DEPOSIT_FIELDS}
+            for field, values in fields.items():
+                if values.dtype.kind == 'U':
+                    fields[field] = tuple(values.tolist())
+                else:
+                    values.flags.writeable = False
+            buckets[bracket] = DepositBucket(**fields)
+
+        index_links = None
+        if "fund_index_primary" in npz.files:  # 지수 연결 기록 이전 스냅샷은 카테고리 상관관계만 가능
+            fields = {field: npz[f"fund_index_{field}"] for field in INDEX_LINK_FIELDS}
+            index_links = IndexLinks(**{field: tuple(values.tolist()) if values.dtype.kind == 'U' else values
+                                        for field, values in fields.items()})
+
+        universe = assemble_asset_universe(
+            tuple(npz["fund_names"].tolist()), tuple(npz["fund_categories"].tolist()),
+            npz["fund_expected_returns"], npz["fund_std_devs"], rule_table, index_links, covariance_model)
+
+    return Dataset(
+        version=meta["dataset_version"],
+        survey_index=_survey_from_json(meta["survey_index"]),
+        deposit_index=DepositIndex(buckets=buckets),
+        fund_universe=universe,
+        source="snapshot",
+        fund_stats=meta.get("fund_stats", "period"),  # 기준 기록 이전 스냅샷은 기간별 추정
+        fund_report=meta.get("fund_report"),
+    )
+
+
+# 스냅샷이 있고 CSV와 버전이 같으면 스냅샷, 아니면 CSV에서 로드 (CSV가 하나도 없으면 스냅샷만 사용)
+def load_dataset(data_dir='data', snapshot_path=None, rule_table=None, fund_stats='period', covariance_model=None):
+    paths = data_paths(data_dir)
+    present = [os.path.exists(path) for path in paths]
+    version = dataset_version(paths) if all(present) else None
+    if snapshot_path and os.path.exists(snapshot_path):
+        try:
+            dataset = load_snapshot(snapshot_path, rule_table, covariance_model)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("스냅샷 로드 실패 (%s) → CSV에서 로드", e)
+        else:
+            if dataset.fund_stats != fund_stats and any(present):
+                logger.warning("스냅샷 펀드 통계 기준 %s ≠ %s → CSV에서 로드", dataset.fund_stats, fund_stats)
+            elif (covariance_model is not None and covariance_model.kind == 'factor'
+                  and dataset.fund_universe.index_links is None and any(present)):
+                logger.warning("스냅샷에 펀드별 참고 지수가 없음 → 팩터 공분산을 위해 CSV에서 로드")
+            elif dataset.version == version or not any(present):
+                return dataset
+            else:
+                logger.warning("스냅샷 버전 %s ≠ 데이터 버전 %s → CSV에서 로드", dataset.version, version)
+    return read_csv_dataset(data_dir, rule_table, fund_stats, covariance_model)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IRP 데이터 스냅샷 생성")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--out", default=None, help="스냅샷 경로 (기본: <data-dir>/snapshot.npz)")
+    parser.add_argument("--fund-stats", default=os.environ.get('IRP_FUND_STATS', 'period'), choices=FUND_STATS_SOURCES)
+    args = parser.parse_args()
+    out_path = args.out or os.path.join(args.data_dir, 'snapshot.npz')
+    meta = build_snapshot(args.data_dir, out_path, args.fund_stats)
+    report = meta["fund_report"]
+    print(f"[SNAPSHOT] 펀드 {report['loaded']}/{report['rows']}개 (지수 기반 {report['index_stats']}, "
+          f"기간별 추정 {report['period_stats']}, 제외 {len(report['rejected'])})")
+
+    started = time.perf_counter()
+    load_snapshot(out_path)
+    print(f"[SNAPSHOT] 로드 시간 {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
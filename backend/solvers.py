@@ -0,0 +1,161 @@
+# solvers.py
+# optimize_portfolio용 솔버 백엔드 (SLSQP + 해석적 그래디언트, 심플렉스 사영 기반 QP)
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class SolverResult:
+    x: np.ndarray
+    fun: float
+    success: bool
+    nit: int
+    message: str
+
+
+# 효용 함수 그래디언트: -ER + 2·alpha·A·Sigma·w - 0.5·∇var(w),  ∇var(w) = 2(w - mean(w)) / N
+def utility_gradient(weights, ER, Sigma, A, alpha=0.5):
+    num_assets = len(weights)
+    return -ER + 2 * alpha * A * (Sigma @ weights) - (weights - np.mean(weights)) / num_assets
+
+
+# 인덱스 목록 → 0/1 마스크
+def index_mask(indices, num_assets):
+    mask = np.zeros(num_assets)
+    mask[np.asarray(indices, dtype=np.intp)] = 1.0
+    return mask
+
+
+# 선형 등식 제약: 전체 합 = 1, 비보장형 합 = target (야코비안은 상수 마스크)
+def get_linear_constraints(non_principal_asset_indices, num_assets, target_risky_ratio):
+    ones = np.ones(num_assets)
+    risky_mask = index_mask(non_principal_asset_indices, num_assets)
+    return [
+        {'type': 'eq', 'fun': lambda x: ones @ x - 1.0, 'jac': lambda x: ones},
+        {'type': 'eq', 'fun': lambda x: risky_mask @ x - target_risky_ratio, 'jac': lambda x: risky_mask},
+    ]
+
+
+def solve_slsqp(utility, ER, Sigma, A, alpha, principal_asset_indices, non_principal_asset_indices,
+                target_risky_ratio, x0, tol=None, max_iter=100):
+    from scipy.optimize import minimize  # SciPy는 SLSQP를 쓸 때만 import
+
+    num_assets = len(ER)
+    result = minimize(
+        fun=utility,
+        x0=x0,
+        args=(ER, Sigma, A, alpha),
+        jac=utility_gradient,
+        method='SLSQP',
+        bounds=[(0, 1.0)] * num_assets,
+        constraints=get_linear_constraints(non_principal_asset_indices, num_assets, target_risky_ratio),
+        tol=tol,
+        options={'disp': False, 'maxiter': max_iter},
+    )
+    return result
+
+
+# {w >= 0, sum(w) = total} 위로의 유클리드 사영 (정렬 기반, O(n log n))
+def project_to_simplex(v, total):
+    if total <= 0:
+        return np.zeros_like(v)
+    u = np.sort(v)[::-1]
+    cssv = np.cumsum(u) - total
+    rho = np.nonzero(u - cssv / np.arange(1, len(u) + 1) > 0)[0][-1]
+    theta = cssv[rho] / (rho + 1)
+    return np.maximum(v - theta, 0.0)
+
+
+def _project_groups(v, groups):
+    w = np.empty_like(v)
+    for idx, total in groups:
+        w[idx] = project_to_simplex(v[idx], total)
+    return w
+
+
+# Sigma 최대 고유값 (거듭제곱법, 행렬곱만 사용)
+def largest_eigenvalue(Sigma, num_assets, iters=30, seed=0):
+    v = np.random.default_rng(seed).random(num_assets)
+    v /= np.linalg.norm(v)
+    eig = 0.0
+    for _ in range(iters):
+        sv = Sigma @ v
+        eig = float(np.linalg.norm(sv))
+        if eig == 0:
+            break
+        v = sv / eig
+    return eig
+
+
+# 그래디언트 립시츠 상수: 2·alpha·A·λmax(Sigma) + 1/N (λmax를 알면 재사용)
+def estimate_lipschitz(Sigma, A, alpha, num_assets, iters=30, seed=0, eigenvalue=None):
+    if eigenvalue is None:
+        eigenvalue = largest_eigenvalue(Sigma, num_assets, iters, seed)
+    return 2 * alpha * A * eigenvalue + 1.0 / num_assets
+
+
+def solve_qp(utility, ER, Sigma, A, alpha, principal_asset_indices, non_principal_asset_indices,
+             target_risky_ratio, x0, tol=1e-7, max_iter=5000, lipschitz=None, eigenvalue=None):
+    # 목적함수는 선형 제약 하의 2차식이고, 실행 가능 영역은 두 개의 스케일된 심플렉스의 곱
+    # (보장형 합 = 1 - target, 비보장형 합 = target) → 가속 사영 경사법 + 백트래킹
+    num_assets = len(ER)
+    risky_idx = np.asarray(non_principal_asset_indices, dtype=np.intp)
+    safe_idx = np.setdiff1d(np.arange(num_assets), risky_idx)
+    if len(risky_idx) == 0 and target_risky_ratio > 0 or len(safe_idx) == 0 and target_risky_ratio < 1:
+        return SolverResult(x=np.asarray(x0, dtype=float), fun=np.nan, success=False, nit=0,
+                            message="목표 비중을 만족하는 실행 가능 해가 없습니다.")
+    groups = [(risky_idx, target_risky_ratio), (safe_idx, 1.0 - target_risky_ratio)]
+
+    def f(w):
+        return utility(w, ER, Sigma, A, alpha)
+
+    def grad(w):
+        return utility_gradient(w, ER, Sigma, A, alpha)
+
+    L = lipschitz if lipschitz is not None else estimate_lipschitz(Sigma, A, alpha, num_assets, eigenvalue=eigenvalue)
+    x = _project_groups(np.asarray(x0, dtype=float), groups)
+    fx = f(x)
+    y, t = x, 1.0
+    nit, converged = 0, False
+
+    for nit in range(1, max_iter + 1):
+        fy, gy = f(y), grad(y)
+        while True:
+            x_new = _project_groups(y - gy / L, groups)
+            diff = x_new - y
+            f_new = f(x_new)
+            if f_new <= fy + gy @ diff + 0.5 * L * (diff @ diff) + 1e-15:
+                break
+            L *= 2.0
+
+        step = np.max(np.abs(x_new - x))
+        if step < tol:
+            x, fx = (x_new, f_new) if f_new <= fx else (x, fx)
+            converged = True
+            break
+
+        # 목적함수가 증가하면 모멘텀 재시작 (비볼록 구간 대비)
+        if f_new > fx:
+            y, t = x, 1.0
+            continue
+
+        t_new = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = x_new + ((t - 1) / t_new) * (x_new - x)
+        x, fx, t = x_new, f_new, t_new
+
+    return SolverResult(x=x, fun=float(fx), success=converged, nit=nit,
+                        message="수렴" if converged else "최대 반복 횟수 초과")
+
+
+SOLVER_BACKENDS = {
+    'slsqp': solve_slsqp,
+    'qp': solve_qp,
+}
+
+
+def get_solver(name):
+    try:
+        return SOLVER_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"지원하지 않는 솔버입니다: {name} (가능: {', '.join(SOLVER_BACKENDS)})") from None
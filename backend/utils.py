@@ -1,82 +1,234 @@
 # utils.py
-import pandas as pd
+# (pandas는 CSV에서 색인을 만들 때만 필요하므로 함수 안에서 import → 스냅샷으로 시작하면 불러오지 않음)
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
 import numpy as np
 
-def calculate_investor_score(user_answers: dict, investor_df: pd.DataFrame) -> float:
-    total_score = 0.0
-    investor_items = ["기대수익률", "투자성향설문", "20%손실감내", "주식펀드비중", "투자상품경험"]
+if TYPE_CHECKING:
+    import pandas as pd
 
-    for item in investor_items:
-        if item in user_answers:
-            answers = user_answers[item]
-            if isinstance(answers, str) and "," in answers:
-                answers = [ans.strip() for ans in answers.split(",")]
-            if isinstance(answers, list):
-                for ans in answers:
-                    match = investor_df[(investor_df["항목명"] == item) & (investor_df["조건값"] == ans)]
-                    if not match.empty:
-                        total_score += float(match.iloc[0]["투자성향 점수"])
-            else:
-                match = investor_df[(investor_df["항목명"] == item) & (investor_df["조건값"] == answers)]
-                if not match.empty:
-                    total_score += float(match.iloc[0]["투자성향 점수"])
-    return total_score
 
-def calculate_A_from_survey(user, weight_df: pd.DataFrame, investor_df: pd.DataFrame):
-    A = 0.0
-    warnings = []
+# 연령대 문자열("30대(35~39세)")에서 나이 추출 (기본값 30)
+def parse_user_age(age_group: str) -> int:
+    age_match = re.search(r'\d+', age_group or "")
+    return int(age_match.group()) if age_match else 30
+
+# 예금 필터링에 쓰이는 연령 구간 (<40, 40대, 50+)
+def age_bracket(user_age: int) -> str:
+    if user_age >= 50:
+        return "50+"
+    elif user_age >= 40:
+        return "40s"
+    return "<40"
+
+# 데이터 파일 내용 기반 버전 문자열 (캐시 키에 사용)
+def dataset_version(paths) -> str:
+    h = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
 
-    raw_score = calculate_investor_score(user.answers, investor_df)
-    investor_score = round(raw_score, 2)
+# 투자성향설문 응답 → 목표 비보장형 비중
+TARGET_RISKY_MAPPING = {
+    "안정형": 0.0,
+    "안정추구형": 0.2,
+    "중립투자형": 0.4,
+    "적극투자형": 0.6,
+    "공격투자형": 0.7
+}
 
+def get_target_risky_ratio(investment_type) -> float:
+    return TARGET_RISKY_MAPPING.get(investment_type, 0.7)
+
+# 투자성향 점수 → 레벨 (0~4)
+def get_investor_level(investor_score: float) -> int:
     if investor_score == 0:
-        investor_level = 0
+        return 0
     elif investor_score <= 1:
-        investor_level = 1
+        return 1
     elif investor_score <= 2:
-        investor_level = 2
+        return 2
     elif investor_score <= 3:
-        investor_level = 3
+        return 3
+    return 4
+
+INVESTOR_ITEMS = ["기대수익률", "투자성향설문", "20%손실감내", "주식펀드비중", "투자상품경험"]
+
+# 설문 점수표 색인: 요청마다 DataFrame을 훑지 않고 dict 조회로 점수 계산
+@dataclass(frozen=True)
+class SurveyIndex:
+    investor_scores: dict   # (항목명, 조건값) → 투자성향 점수
+    age_scores: dict        # 연령대 → 연령대 점수
+    item_scores: dict       # (연령대, 항목명) → {조건값: 조건값 점수} (조건값은 표에 처음 나온 순서)
+
+def build_investor_index(investor_df: pd.DataFrame) -> dict:
+    investor_scores = {}
+    for item, value, score in zip(investor_df["항목명"], investor_df["조건값"], investor_df["투자성향 점수"]):
+        investor_scores.setdefault((item, value), score)  # 중복 시 첫 행 우선
+    return investor_scores
+
+def build_survey_index(weight_df: pd.DataFrame, investor_df: pd.DataFrame) -> SurveyIndex:
+    age_scores = {}
+    item_scores = {}
+    for age_group, age_score, item, value, score in zip(weight_df["연령대"], weight_df["연령대 점수"], weight_df["항목명"],
+                                                        weight_df["조건값"], weight_df["조건값 점수"]):
+        age_scores.setdefault(age_group, age_score)
+        item_scores.setdefault((age_group, item), {}).setdefault(value, score)
+    return SurveyIndex(
+        investor_scores=build_investor_index(investor_df),
+        age_scores=age_scores,
+        item_scores=item_scores,
+    )
+
+# 투자성향 항목 응답(복수 선택은 쉼표 구분) → 응답별 투자성향 점수 (표에 없는 응답은 제외)
+def _investor_item_scores(item: str, answers, investor_index: dict) -> tuple:
+    if isinstance(answers, str) and "," in answers:
+        answers = [ans.strip() for ans in answers.split(",")]
+    if not isinstance(answers, list):
+        answers = [answers]
+    scores = (investor_index.get((item, ans)) for ans in answers)
+    return tuple(float(score) for score in scores if score is not None)
+
+# 투자성향 점수 합계 (외부 호출용, 내부 계산은 score_answers와 같은 색인 사용)
+def calculate_investor_score(user_answers: dict, investor_df: pd.DataFrame, investor_index: dict = None) -> float:
+    if investor_index is None:
+        investor_index = build_investor_index(investor_df)
+    total_score = 0.0
+
+    for item in INVESTOR_ITEMS:
+        if item in user_answers:
+            for score in _investor_item_scores(item, user_answers[item], investor_index):
+                total_score += score
+    return total_score
+
+# 위험 항목 응답 → 조건값 점수, 허용되지 않은 응답이면 경고 dict
+def _risk_item_score(survey_index: SurveyIndex, age_group: str, item_name: str, user_answer):
+    scores = survey_index.item_scores.get((age_group, item_name), {})
+    if user_answer not in scores:
+        return {"항목": item_name, "입력값": user_answer, "허용값": list(scores)}
+    try:
+        return float(scores[user_answer])
+    except Exception as e:
+        return {"항목": item_name, "오류": str(e)}
+
+# 설문 점수 내역: 항목별 점수를 보관해 두면 한 항목만 바꾼 재제출은 그 항목만 다시 계산 (score_answers(previous=...))
+@dataclass(frozen=True)
+class SurveyScore:
+    age_group: str
+    answers: dict           # 응답 (투자성향 레벨 제외)
+    investor_parts: dict    # 투자성향 항목 → 응답별 투자성향 점수
+    item_parts: dict        # 위험 항목 → 조건값 점수 또는 경고 dict (응답 순서)
+    age_score: float
+
+    # 합산 순서는 항목별로 한 번에 계산할 때와 같게 유지 (반올림 결과가 달라지지 않도록)
+    @property
+    def investor_score(self) -> float:
+        total_score = 0.0
+        for item in INVESTOR_ITEMS:
+            for score in self.investor_parts.get(item, ()):
+                total_score += score
+        return round(total_score, 2)
+
+    @property
+    def investor_level(self) -> int:
+        return get_investor_level(self.investor_score)
+
+    @property
+    def A(self) -> float:
+        A = 0.0
+        A += self.investor_level
+        A += self.age_score
+        for part in self.item_parts.values():
+            if not isinstance(part, dict):
+                A += part
+        return round(A, 2)
+
+    @property
+    def warnings(self) -> list:
+        return [part for part in self.item_parts.values() if isinstance(part, dict)]
+
+# 설문 응답 → (점수 내역, 직전 내역 대비 바뀐 항목). 연령대가 같으면 바뀌지 않은 항목의 점수는 재사용
+def score_answers(survey_index: SurveyIndex, age_group: str, answers: dict, previous: SurveyScore = None):
+    answers = {item: value for item, value in answers.items() if item != "투자성향"}
+    if previous is None or previous.age_group != age_group:
+        changed, previous = tuple(answers), None
     else:
-        investor_level = 4
+        changed = tuple(item for item in answers if item not in previous.answers or answers[item] != previous.answers[item]) \
+            + tuple(item for item in previous.answers if item not in answers)
 
-    A += investor_level
-    user.answers["투자성향"] = investor_level
+    investor_parts, item_parts = {}, {}
+    for item, value in answers.items():
+        reuse = previous is not None and item not in changed
+        if item in INVESTOR_ITEMS:
+            investor_parts[item] = (previous.investor_parts[item] if reuse
+                                    else _investor_item_scores(item, value, survey_index.investor_scores))
+        else:
+            item_parts[item] = (previous.item_parts[item] if reuse
+                                else _risk_item_score(survey_index, age_group, item, value))
+    score = SurveyScore(
+        age_group=age_group,
+        answers=answers,
+        investor_parts=investor_parts,
+        item_parts=item_parts,
+        age_score=float(survey_index.age_scores.get(age_group, 0.0)),
+    )
+    return score, changed
 
-    age_row = weight_df[weight_df["연령대"] == user.age_group]
-    if not age_row.empty:
-        A += float(age_row.iloc[0]["연령대 점수"])
+def calculate_A_from_survey(user, weight_df: pd.DataFrame, investor_df: pd.DataFrame, survey_index: SurveyIndex = None):
+    if survey_index is None:
+        survey_index = build_survey_index(weight_df, investor_df)
+    score, _ = score_answers(survey_index, user.age_group, user.answers)
+    user.answers["투자성향"] = score.investor_level
+    return score.A, score.warnings, score.investor_score
 
-    exclude_items = ["기대수익률", "투자성향설문", "20%손실감내", "주식펀드비중", "투자상품경험"]
+# 예금 후보 색인: 연령 구간별 '기본상품명당 최고 금리' 상품과 금리 내림차순 누적비율을 1회만 계산
+@dataclass(frozen=True)
+class DepositBucket:
+    names: tuple                # 상품명 (기본상품명 순)
+    rates: np.ndarray           # 연 금리(%)
+    ranked_names: tuple         # 금리 내림차순 상품명
+    ranked_rates: np.ndarray    # 금리 내림차순 연 금리(%)
+    cumulative_ratio: np.ndarray  # 금리 내림차순 누적비율
+    ranked: pd.DataFrame = None   # 원본 컬럼 포함 (CSV에서 만든 경우만)
 
-    for item_name, user_answer in user.answers.items():
-        if item_name in exclude_items:
-            continue
-        if item_name == "투자성향" and isinstance(user_answer, int):
-            continue
+    # 누적비율 기준 선택 → 금리 내림차순 위치
+    def select_by_cumsum(self, cumsum_threshold: float = 0.7, max_count: int = 5) -> np.ndarray:
+        return np.flatnonzero(self.cumulative_ratio <= cumsum_threshold)[:max_count]
 
-        valid_values = weight_df[(weight_df["연령대"] == user.age_group) & (weight_df["항목명"] == item_name)]["조건값"].unique().tolist()
+@dataclass(frozen=True)
+class DepositIndex:
+    buckets: dict           # 연령 구간 → DepositBucket
 
-        if user_answer not in valid_values:
-            warnings.append({"항목": item_name, "입력값": user_answer, "허용값": valid_values})
-            continue
+    def bucket(self, user_age: int) -> DepositBucket:
+        return self.buckets[age_bracket(user_age)]
 
-        match_row = weight_df[(weight_df["연령대"] == user.age_group) & (weight_df["항목명"] == item_name) & (weight_df["조건값"] == user_answer)]
+# 연령 구간별 대표 나이
+BRACKET_AGES = {"<40": 30, "40s": 40, "50+": 50}
 
-        if not match_row.empty:
-            try:
-                score = float(match_row.iloc[0]["조건값 점수"])
-                A += score
-            except Exception as e:
-                warnings.append({"항목": item_name, "오류": str(e)})
+def _readonly(values, dtype=float) -> np.ndarray:
+    arr = np.ascontiguousarray(values, dtype=dtype)
+    arr.flags.writeable = False
+    return arr
 
-    return round(A, 2), warnings, investor_score
+def _build_deposit_bucket(principal_df: pd.DataFrame, user_age: int) -> DepositBucket:
+    import pandas as pd
 
-def filter_best_principal_products_by_age_cumsum(principal_df: pd.DataFrame, user_age: int, cumsum_threshold: float = 0.7, max_count: int = 5) -> pd.DataFrame:
     principal_df = principal_df.copy()
     principal_df['연 금리(%)'] = pd.to_numeric(principal_df['연 금리(%)'], errors='coerce')
     filtered_df = principal_df.dropna(subset=['연 금리(%)'])
 
+    if filtered_df.empty:
+        print("[WARN] 유효한 연 금리 데이터가 있는 예금 상품을 찾을 수 없습니다.")
+        empty = filtered_df.assign(기본상품명=pd.Series(dtype=str), 누적비율=pd.Series(dtype=float))
+        return DepositBucket(names=(), rates=_readonly([]), ranked_names=(), ranked_rates=_readonly([]),
+                             cumulative_ratio=_readonly([]), ranked=empty)
+
     if user_age >= 50:
         filtered_df = filtered_df[
             (filtered_df['상품종류'].str.contains("정기예금")) &
@@ -89,15 +241,32 @@ def filter_best_principal_products_by_age_cumsum(principal_df: pd.DataFrame, use
         print(f"[WARN] 나이 {user_age} 조건에 맞는 상품 없음 → 전체 상품에서 재선택")
         filtered_df = principal_df.dropna(subset=['연 금리(%)'])
 
-    filtered_df['기본상품명'] = filtered_df['상품명'].apply(lambda x: x.split('(')[0].strip())
+    filtered_df = filtered_df.assign(기본상품명=filtered_df['상품명'].str.split('(').str[0].str.strip())
     best_per_base = filtered_df.loc[filtered_df.groupby('기본상품명')['연 금리(%)'].idxmax()]
-    best_per_base = best_per_base.sort_values(by='연 금리(%)', ascending=False).reset_index(drop=True)
 
-    best_per_base['누적비율'] = best_per_base['연 금리(%)'].cumsum() / best_per_base['연 금리(%)'].sum()
-    result = best_per_base[best_per_base['누적비율'] <= cumsum_threshold]
-    if len(result) > max_count:
-        result = result.head(max_count)
-    return result
+    ranked = best_per_base.sort_values(by='연 금리(%)', ascending=False).reset_index(drop=True)
+    ranked['누적비율'] = ranked['연 금리(%)'].cumsum() / ranked['연 금리(%)'].sum()
+    return DepositBucket(
+        names=tuple(best_per_base['상품명']),
+        rates=_readonly(best_per_base['연 금리(%)']),
+        ranked_names=tuple(ranked['상품명']),
+        ranked_rates=_readonly(ranked['연 금리(%)']),
+        cumulative_ratio=_readonly(ranked['누적비율']),
+        ranked=ranked,
+    )
+
+def build_deposit_index(principal_df: pd.DataFrame) -> DepositIndex:
+    return DepositIndex(buckets={
+        bracket: _build_deposit_bucket(principal_df, user_age) for bracket, user_age in BRACKET_AGES.items()
+    })
+
+# 나이 조건 예금 후보 (기준 진입점, DepositIndex의 연령 구간 결과를 그대로 사용)
+def filter_best_principal_products_by_age_cumsum(principal_df: pd.DataFrame, user_age: int, cumsum_threshold: float = 0.7, max_count: int = 5,
+                                                 deposit_index: DepositIndex = None) -> pd.DataFrame:
+    bucket = deposit_index.bucket(user_age) if deposit_index is not None else None
+    if bucket is None or bucket.ranked is None:
+        bucket = _build_deposit_bucket(principal_df, user_age)
+    return bucket.ranked.iloc[bucket.select_by_cumsum(cumsum_threshold, max_count)]
 
 def get_alpha_by_A(A):
     if A >= 9.0:
@@ -113,7 +282,14 @@ def get_alpha_by_A(A):
     else:
         return 0.1
 
+# 펀드 효용점수: 수익률 - A × 변동성 (위험회피도가 클수록 변동성 감점이 커짐)
+def fund_utility_scores(returns, volatilities, A: float) -> np.ndarray:
+    return np.asarray(returns, dtype=float) - A * np.asarray(volatilities, dtype=float)
+
+# A 기준 효용점수 상위 펀드 (DataFrame 진입점, 점수는 screening과 같은 fund_utility_scores)
 def adjust_fund_selection_by_A(fund_df: pd.DataFrame, A: float, top_n: int = 5) -> pd.DataFrame:
+    import pandas as pd
+
     fund_df = fund_df.copy()
     if '지수_연환산수익률' in fund_df.columns and '지수_연환산변동성' in fund_df.columns:
         fund_df['수익률'] = pd.to_numeric(fund_df['지수_연환산수익률'], errors='coerce')
@@ -125,6 +301,6 @@ def adjust_fund_selection_by_A(fund_df: pd.DataFrame, A: float, top_n: int = 5)
         raise ValueError("펀드 데이터에 필요한 수익률/변동성 컬럼이 없습니다.")
 
     fund_df = fund_df.dropna(subset=['수익률', '변동성'])
-    fund_df['효용점수'] = fund_df['수익률'] - A * fund_df['변동성']
+    fund_df['효용점수'] = fund_utility_scores(fund_df['수익률'], fund_df['변동성'], A)
     fund_df = fund_df.sort_values(by='효용점수', ascending=False)
     return fund_df.head(top_n)
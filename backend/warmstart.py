@@ -0,0 +1,156 @@
+# warmstart.py
+# 최적화 초기 가중치(x0) 저장소: 이전에 푼 해 중 가장 가까운 입력의 해를 재사용
+#   python warmstart.py [--data-dir data] [--solver qp]  → 이웃 초기값 해와 처음부터 푼 해의 차이 확인
+import argparse
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 가까운 입력의 해를 초기값으로 재사용하는 방식
+#   목적함수의 분산 항 0.5·(1 - var(w))는 오목해서 전체가 볼록하다는 보장은 없음 (solvers.solve_qp의 모멘텀 재시작)
+#   → QP는 실제 연령 구간 데이터에서 이웃 초기값 해가 처음부터 푼 해와 WARM_START_TOLERANCE 이내인지
+#     이 모듈의 CLI로 확인한 방식만 등록 (데이터/목적함수를 바꾸면 다시 확인)
+#   SLSQP는 초기값에 따라 다른 해에서 멈춤 (비중 차 최대 0.24) → 같은 입력의 해만 재사용
+NEIGHBOR_WARM_START_SOLVERS = ('qp',)
+WARM_START_TOLERANCE = 1e-4     # 비중 최대 차이 (응답 비중은 소수 4자리로 반올림)
+
+
+# 자산 집합 식별자 (기대수익률 + 비보장형 인덱스가 같으면 같은 문제 공간)
+def asset_fingerprint(ER, non_principal_asset_indices):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(ER, dtype=float).tobytes())
+    h.update(np.asarray(non_principal_asset_indices, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+# 목표 비중 분할에 따른 결정적 초기값 (최적화 실패 시 대체 가중치와 동일)
+def target_ratio_split(num_assets, principal_asset_indices, non_principal_asset_indices, target_risky_ratio):
+    weights = np.zeros(num_assets)
+
+    # 비보장형 자산 비중 할당
+    if len(non_principal_asset_indices) > 0:
+        weights[list(non_principal_asset_indices)] = target_risky_ratio / len(non_principal_asset_indices)
+
+    # 보장형 자산 비중 할당 (1 - 비보장형 총 비중)
+    if len(principal_asset_indices) > 0:
+        weights[list(principal_asset_indices)] = (1.0 - target_risky_ratio) / len(principal_asset_indices)
+
+    # 합계가 1이 되지 않을 수 있으므로 마지막에 정규화
+    if np.sum(weights) > 0:
+        weights /= np.sum(weights)
+    return weights
+
+
+class WarmStartStore:
+    def __init__(self, max_entries=512, a_decimals=2, ratio_decimals=2):
+        self.max_entries = max_entries
+        self.a_decimals = a_decimals
+        self.ratio_decimals = ratio_decimals
+        self._entries = OrderedDict()  # (fingerprint, target, A, alpha) → weights
+        self._lock = threading.Lock()
+
+    def _key(self, fingerprint, A, alpha, target_risky_ratio):
+        return (fingerprint, round(float(target_risky_ratio), self.ratio_decimals),
+                round(float(A), self.a_decimals), round(float(alpha), 4))
+
+    # 같은 자산 집합·목표 비중에서 (A, alpha)가 가장 가까운 해 (exact=True면 같은 입력의 해만)
+    def lookup(self, fingerprint, A, alpha, target_risky_ratio, exact=False):
+        key = self._key(fingerprint, A, alpha, target_risky_ratio)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key].copy()
+            if exact:
+                return None
+
+            best, best_dist = None, None
+            for (fp, ratio, a_q, alpha_q), weights in self._entries.items():
+                if fp != key[0] or ratio != key[1]:
+                    continue
+                dist = abs(a_q - key[2]) + abs(alpha_q - key[3])
+                if best_dist is None or dist < best_dist:
+                    best, best_dist = weights, dist
+            return None if best is None else best.copy()
+
+    def store(self, fingerprint, A, alpha, target_risky_ratio, weights):
+        key = self._key(fingerprint, A, alpha, target_risky_ratio)
+        weights = np.array(weights, dtype=float)
+        weights.flags.writeable = False
+        with self._lock:
+            self._entries[key] = weights
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 같은 연령 구간·목표 비중에서 A가 이웃한 입력의 해를 초기값으로 푼 결과 vs 처음부터 푼 결과 (비중 최대 차이)
+def compare_neighbor_warm_starts(ER, Sigma, A_values, target_risky_ratio, principal_asset_indices,
+                                 non_principal_asset_indices, solver='qp'):
+    from optimizer import get_alpha_by_A, optimize_portfolio
+
+    A_values = sorted(A_values)
+    cold = {A: optimize_portfolio(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices,
+                                  target_risky_ratio, get_alpha_by_A(A), solver=solver)[0] for A in A_values}
+    diffs = []
+    for A0, A1 in zip(A_values, A_values[1:]):
+        for source, A in ((A0, A1), (A1, A0)):
+            warm, _ = optimize_portfolio(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices,
+                                         target_risky_ratio, get_alpha_by_A(A), solver=solver, x0=cold[source])
+            diffs.append((source, A, float(np.abs(warm - cold[A]).max())))
+    return diffs
+
+
+def main():
+    from types import SimpleNamespace
+
+    import pandas as pd
+
+    from optimizer import calculate_er_sigma
+    from precompute import enumerate_canonical_inputs
+    from snapshot import read_csv_dataset
+
+    parser = argparse.ArgumentParser(description="이웃 입력 초기값(웜스타트) 해와 처음부터 푼 해 비교")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--solver", default=os.environ.get('IRP_SOLVER', 'qp'))
+    parser.add_argument("--fund-stats", default=os.environ.get('IRP_FUND_STATS', 'period'))
+    parser.add_argument("--tolerance", type=float, default=WARM_START_TOLERANCE)
+    args = parser.parse_args()
+
+    dataset = read_csv_dataset(args.data_dir, fund_stats=args.fund_stats)
+    weight_df = pd.read_csv(os.path.join(args.data_dir, 'final_weight_table.csv'), encoding='utf-8')
+    investor_df = pd.read_csv(os.path.join(args.data_dir, 'invest_score.csv'), encoding='utf-8')
+    inputs, age_groups = enumerate_canonical_inputs(weight_df, investor_df)
+    groups = {}
+    for bracket, A, target_risky_ratio, _ in inputs:
+        groups.setdefault((bracket, target_risky_ratio), set()).add(A)
+
+    worst = (0.0, None)
+    for (bracket, target_risky_ratio), A_values in sorted(groups.items()):
+        ER, Sigma, _, principal_asset_indices, non_principal_asset_indices = calculate_er_sigma(
+            None, None, min(A_values), SimpleNamespace(age_group=age_groups[bracket]),
+            universe=dataset.fund_universe, deposit_index=dataset.deposit_index)
+        for source, A, diff in compare_neighbor_warm_starts(ER, Sigma, A_values, target_risky_ratio,
+                                                            principal_asset_indices, non_principal_asset_indices,
+                                                            args.solver):
+            if diff > worst[0]:
+                worst = (diff, (bracket, target_risky_ratio, source, A))
+    print(f"[WARMSTART] {args.solver}: {len(groups)}개 그룹, 비중 최대 차이 {worst[0]:.2e} {worst[1] or ''} "
+          f"(허용 {args.tolerance:.0e})")
+    if worst[0] > args.tolerance:
+        print(f"[WARMSTART] 허용 오차 초과 → NEIGHBOR_WARM_START_SOLVERS에서 {args.solver}를 빼야 함")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# workers.py
+# 최적화 전용 프로세스 풀: 동시 실행 수 제한, 대기열 한도 초과 시 거절, 동일 요청 합치기
+# (워커에서 numpy를 불러오기 전에 BLAS 스레드 수를 고정해야 하므로 이 모듈은 numpy를 import하지 않음)
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+BLAS_THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+class PoolSaturated(Exception):
+    """대기 중인 최적화 작업이 한도를 넘음 (→ 503)"""
+
+
+# 워커 초기화: 워커 1개당 BLAS 스레드 수 고정 (프로세스 수 × BLAS 스레드 ≤ 코어 수)
+def _pin_blas_threads(blas_threads):
+    for var in BLAS_THREAD_VARS:
+        os.environ[var] = str(blas_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(blas_threads)
+    except ImportError:
+        pass
+
+
+# 워커 예열: 최적화 모듈을 미리 import
+def _warm_up():
+    import optimizer  # noqa: F401
+    return os.getpid()
+
+
+# 워커에서 실행되는 최적화 (초기값/웜스타트 저장과 지표 기록은 호출 측에서 처리) → (비중, 솔버 통계)
+def solve_in_worker(ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio, alpha,
+                    solver, x0, active=None):
+    from optimizer import optimize_portfolio
+    stats = {}
+    weights, _ = optimize_portfolio(
+        ER, Sigma, A, principal_asset_indices, non_principal_asset_indices, target_risky_ratio, alpha,
+        solver=solver, x0=x0, active=active, stats=stats)
+    return weights, stats
+
+
+# 워커에서 실행되는 투자선 계산 (active: None 또는 A → 위치 배열, 프로세스 간 전달되도록 dict.get 등)
+def frontier_in_worker(ER, Sigma, A_values, target_risky_ratios, principal_asset_indices, non_principal_asset_indices,
+                       solver, active=None):
+    from optimizer import optimize_frontier
+    return optimize_frontier(ER, Sigma, A_values, target_risky_ratios, principal_asset_indices,
+                             non_principal_asset_indices, solver=solver, active=active)
+
+
+class SolverPool:
+    def __init__(self, max_workers=None, max_pending=None, blas_threads=1):
+        self.max_workers = max_workers if max_workers is not None else min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending if max_pending is not None else max(self.max_workers, 1) * 8
+        self.blas_threads = blas_threads
+        self._executor = None
+        self._inflight = {}  # key → asyncio.Future (동일 입력 합치기)
+        self.pending = 0
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # max_workers == 0 이면 프로세스 풀 없이 기본 스레드 풀에서 실행
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_pin_blas_threads,
+                initargs=(self.blas_threads,),
+            )
+        return self._executor
+
+    # 첫 요청이 프로세스 생성/import 비용을 치르지 않도록 워커를 미리 띄움
+    def start(self):
+        executor = self._get_executor()
+        if executor is not None:
+            for _ in range(self.max_workers):
+                executor.submit(_warm_up)
+
+    async def run(self, key, fn, *args):
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturated(f"최적화 대기열이 가득 찼습니다 ({self.pending}/{self.max_pending})")
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), fn, *args)
+        self._inflight[key] = future
+        self.pending += 1
+        self.submitted += 1
+        # 먼저 요청한 쪽이 취소돼도 작업이 끝날 때까지 자리를 차지하도록 완료 콜백에서 정리
+        future.add_done_callback(lambda _: self._release(key, future))
+        return await asyncio.shield(future)
+
+    def _release(self, key, future):
+        self.pending -= 1
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "queue_depth": self.pending,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None